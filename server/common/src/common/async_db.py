@@ -0,0 +1,116 @@
+import logging
+import uuid
+from typing import AsyncIterator
+
+from psycopg import AsyncClientCursor, AsyncConnection, AsyncCursor
+from psycopg.abc import Params, Query
+from psycopg_pool import AsyncConnectionPool
+from pydantic import PostgresDsn
+
+from common.db import MAX_LOGGED_QUERY_LENGTH, move_search_path_to_options
+from common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+ASYNC_CONNECTION_POOLS: dict[str, AsyncConnectionPool] = {}
+
+
+async def get_connection_pool(
+    db_uri: PostgresDsn, *, min_size: int = 4
+) -> AsyncConnectionPool:
+    db_uri_str = str(db_uri)
+    if db_uri_str not in ASYNC_CONNECTION_POOLS:
+        new_db_uri = move_search_path_to_options(db_uri_str)
+        # async pool can be opened only in running event loop
+        ASYNC_CONNECTION_POOLS[db_uri_str] = AsyncConnectionPool(
+            new_db_uri,
+            min_size=min_size,
+            kwargs={
+                "cursor_factory": AsyncClientCursor,
+            },
+            open=False,
+        )
+    pool = ASYNC_CONNECTION_POOLS[db_uri_str]
+    await pool.open()
+    return pool
+
+
+async def close_connection_pools():
+    while ASYNC_CONNECTION_POOLS:
+        _, pool = ASYNC_CONNECTION_POOLS.popitem()
+        await pool.close()
+
+
+def _log_query(conn: AsyncConnection, query: Query, params: Params | None):
+    if settings.database_log_queries:
+        query_str = AsyncClientCursor(conn).mogrify(query, params)
+        if len(query_str) > MAX_LOGGED_QUERY_LENGTH:
+            query_str = query_str[:MAX_LOGGED_QUERY_LENGTH] + "..."
+        logger.info(f"query={query_str}")
+
+
+async def run_query(
+    query: Query, params: Params | None = None, *, db_uri: PostgresDsn
+) -> list:
+    pool = await get_connection_pool(db_uri=db_uri)
+    async with pool.connection() as conn:
+        await conn.set_autocommit(True)
+
+        async with conn.cursor() as cur:
+            _log_query(conn, query, params)
+            await cur.execute(query, params)
+            rows = await cur.fetchall()
+
+    return rows
+
+
+async def run_prepared_query(
+    query: Query, params: Params | None = None, *, db_uri: PostgresDsn
+) -> list:
+    """
+    Like run_query, but parameters are bound server-side and the statement is
+    prepared on the connection, see common.db.run_prepared_query.
+    """
+    pool = await get_connection_pool(db_uri=db_uri)
+    async with pool.connection() as conn:
+        await conn.set_autocommit(True)
+
+        async with AsyncCursor(conn) as cur:
+            _log_query(conn, query, params)
+            await cur.execute(query, params, prepare=True)
+            rows = await cur.fetchall()
+
+    return rows
+
+
+async def run_statement(
+    query: Query, params: Params | None = None, *, db_uri: PostgresDsn
+):
+    pool = await get_connection_pool(db_uri=db_uri)
+    async with pool.connection() as conn:
+        await conn.set_autocommit(True)
+
+        async with conn.cursor() as cur:
+            _log_query(conn, query, params)
+            await cur.execute(query, params)
+
+
+async def iter_query(
+    query: Query,
+    params: Params | None = None,
+    *,
+    db_uri: PostgresDsn,
+    itersize: int = 1000,
+) -> AsyncIterator[tuple]:
+    """
+    Stream rows of the query using server-side cursor, fetching itersize rows
+    at once. Connection is held until the iterator is exhausted or closed.
+    """
+    pool = await get_connection_pool(db_uri=db_uri)
+    async with pool.connection() as conn, conn.transaction():
+        _log_query(conn, query, params)
+        async with conn.cursor(name=f"iter_query_{uuid.uuid4().hex}") as cur:
+            cur.itersize = itersize
+            await cur.execute(query, params)
+            async for row in cur:
+                yield row
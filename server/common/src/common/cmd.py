@@ -1,4 +1,16 @@
+import asyncio
+import logging
 import subprocess
+from contextlib import suppress
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+from common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 
 def run_cmd(cmd: str) -> str:
@@ -13,3 +25,85 @@ def run_cmd(cmd: str) -> str:
         f"stdout:\n{stdout}\nstderr:\n{stderr}"
     )
     return stdout.decode("utf-8")
+
+
+_cmd_semaphore: asyncio.Semaphore | None = None
+
+
+def _get_cmd_semaphore() -> asyncio.Semaphore:
+    global _cmd_semaphore
+    if _cmd_semaphore is None:
+        _cmd_semaphore = asyncio.Semaphore(settings.cmd_max_processes)
+    return _cmd_semaphore
+
+
+async def _log_lines(
+    stream: asyncio.StreamReader, level: int, lines: list[str], pid: int
+):
+    while line_bytes := await stream.readline():
+        line = line_bytes.decode("utf-8", errors="replace").rstrip("\n")
+        logger.log(level, f"[{pid}] {line}")
+        lines.append(line)
+
+
+async def run_cmd_async(cmd: list[str], *, timeout: float | None = None) -> str:
+    """
+    Like run_cmd, but without blocking the event loop and without shell.
+    Output is logged line by line as it is produced. At most
+    settings.cmd_max_processes commands run at once, others wait. The process
+    is killed if it runs longer than timeout seconds
+    (settings.cmd_timeout_seconds by default), raising TimeoutError, or if the
+    calling task is cancelled.
+    """
+    if timeout is None:
+        timeout = settings.cmd_timeout_seconds
+    async with _get_cmd_semaphore():
+        logger.info(f"running {subprocess.list2cmdline(cmd)}")
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        assert process.stdout is not None and process.stderr is not None
+        stdout: list[str] = []
+        stderr: list[str] = []
+        try:
+            async with asyncio.timeout(timeout):
+                await asyncio.gather(
+                    _log_lines(process.stdout, logging.INFO, stdout, process.pid),
+                    _log_lines(process.stderr, logging.WARNING, stderr, process.pid),
+                )
+                return_code = await process.wait()
+        finally:
+            if process.returncode is None:
+                logger.warning(f"killing {process.pid}")
+                process.kill()
+                await process.wait()
+    stdout_str = "\n".join(stdout)
+    stderr_str = "\n".join(stderr)
+    assert return_code == 0, (
+        f"command {cmd} failed with return code {return_code}\n"
+        f"stdout:\n{stdout_str}\nstderr:\n{stderr_str}"
+    )
+    return stdout_str
+
+
+async def run_until_disconnected(
+    request: Request, awaitable: Awaitable[T], *, poll_seconds: float = 1.0
+) -> T:
+    """
+    Await the awaitable, cancel it if client of the request disconnects in the
+    meantime.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client of {request.url.path} disconnected")
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
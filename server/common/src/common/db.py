@@ -1,17 +1,24 @@
 import logging
+import uuid
+from typing import Iterator
 from urllib.parse import parse_qs, urlencode, urlparse
 
-from psycopg import ClientCursor
+from psycopg import ClientCursor, Connection, Cursor
 from psycopg.abc import Params, Query
 from psycopg_pool import ConnectionPool
 from pydantic import PostgresDsn
 
+from common.settings import settings
+
 logger = logging.getLogger(__name__)
 
 CONNECTION_POOLS: dict[str, ConnectionPool] = {}
 
+# queries with large parameters (e.g. GeoJSON) are logged truncated
+MAX_LOGGED_QUERY_LENGTH = 10_000
+
 
-def _move_search_path_to_options(db_uri: str) -> str:
+def move_search_path_to_options(db_uri: str) -> str:
     new_db_uri = urlparse(db_uri)
     query_params = parse_qs(new_db_uri.query)
     search_path = query_params.pop("search_path", None)
@@ -26,12 +33,13 @@ def _move_search_path_to_options(db_uri: str) -> str:
     return new_db_uri
 
 
-def get_connection_pool(db_uri: PostgresDsn) -> ConnectionPool:
+def get_connection_pool(db_uri: PostgresDsn, *, min_size: int = 4) -> ConnectionPool:
     db_uri_str = str(db_uri)
     if db_uri_str not in CONNECTION_POOLS:
-        new_db_uri = _move_search_path_to_options(db_uri_str)
+        new_db_uri = move_search_path_to_options(db_uri_str)
         CONNECTION_POOLS[db_uri_str] = ConnectionPool(
             new_db_uri,
+            min_size=min_size,
             kwargs={
                 "cursor_factory": ClientCursor,
             },
@@ -40,6 +48,14 @@ def get_connection_pool(db_uri: PostgresDsn) -> ConnectionPool:
     return pool
 
 
+def _log_query(conn: Connection, query: Query, params: Params | None):
+    if settings.database_log_queries:
+        query_str = ClientCursor(conn).mogrify(query, params)
+        if len(query_str) > MAX_LOGGED_QUERY_LENGTH:
+            query_str = query_str[:MAX_LOGGED_QUERY_LENGTH] + "..."
+        logger.info(f"query={query_str}")
+
+
 def run_query(
     query: Query, params: Params | None = None, *, db_uri: PostgresDsn
 ) -> list:
@@ -48,20 +64,59 @@ def run_query(
         conn.autocommit = True
 
         with conn.cursor() as cur:
-            assert isinstance(cur, ClientCursor)
-            logger.info(f"query={cur.mogrify(query, params)}")
+            _log_query(conn, query, params)
             cur.execute(query, params)
             rows = cur.fetchall()
 
     return rows
 
 
+def run_prepared_query(
+    query: Query, params: Params | None = None, *, db_uri: PostgresDsn
+) -> list:
+    """
+    Like run_query, but parameters are bound server-side and the statement is
+    prepared on the connection, so that repeated queries of the same text are
+    planned only once per connection. Query must use placeholders for values,
+    not literals.
+    """
+    pool = get_connection_pool(db_uri=db_uri)
+    with pool.connection() as conn:
+        conn.autocommit = True
+
+        with Cursor(conn) as cur:
+            _log_query(conn, query, params)
+            cur.execute(query, params, prepare=True)
+            rows = cur.fetchall()
+
+    return rows
+
+
 def run_statement(query: Query, params: Params | None = None, *, db_uri: PostgresDsn):
     pool = get_connection_pool(db_uri=db_uri)
     with pool.connection() as conn:
         conn.autocommit = True
 
         with conn.cursor() as cur:
-            assert isinstance(cur, ClientCursor)
-            logger.info(f"query={cur.mogrify(query, params)}")
+            _log_query(conn, query, params)
+            cur.execute(query, params)
+
+
+def iter_query(
+    query: Query,
+    params: Params | None = None,
+    *,
+    db_uri: PostgresDsn,
+    itersize: int = 1000,
+) -> Iterator[tuple]:
+    """
+    Stream rows of the query using server-side cursor, fetching itersize rows
+    at once. Connection is held until the iterator is exhausted or closed.
+    """
+    pool = get_connection_pool(db_uri=db_uri)
+    with pool.connection() as conn, conn.transaction():
+        _log_query(conn, query, params)
+        with conn.cursor(name=f"iter_query_{uuid.uuid4().hex}") as cur:
+            cur.itersize = itersize
             cur.execute(query, params)
+            yield from cur
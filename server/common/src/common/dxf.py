@@ -0,0 +1,19 @@
+# ogr2ogr options of conversion of DXF files to polygons only, without output
+# format, shared by conversion in ogr2ogr service and DXF pipeline in qgis
+# service
+
+DXF_OPTIONS = [
+    "-a_srs",
+    "EPSG:5514",
+    "-dim",
+    "XY",
+    "-dialect",
+    "SQLITE",
+    "-sql",
+    "SELECT * FROM entities WHERE LOWER(GeometryType(geometry)) LIKE '%polygon%'",
+]
+DXF_CONFIG = {
+    "DXF_FEATURE_LIMIT_PER_BLOCK": "-1",
+    "DXF_ENCODING": "utf-8",
+    "DXF_HATCH_TOLERANCE": "2",
+}
@@ -1,11 +1,21 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
 import os.path
 import uuid
+from typing import Any, Awaitable, Callable, TypeVar
 from urllib.parse import quote, unquote, urljoin
 
 from pydantic import HttpUrl
 
 from common.settings import settings
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 
 def file_path_to_static_url(file_path: str) -> str:
     rel_path = quote(os.path.relpath(file_path, settings.files_dir_path))
@@ -26,8 +36,67 @@ def static_url_to_file_path(static_url: HttpUrl) -> str:
     )
 
 
-def get_output_path(input_path: str) -> str:
+@functools.lru_cache(maxsize=1024)
+def _get_file_hash(file_path: str, mtime_ns: int, size: int) -> str:
+    # mtime_ns and size are part of the cache key only, so changed file is
+    # hashed again
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_file_hash(file_path: str) -> str:
+    """
+    SHA-256 of content of the file, cached until the file is changed.
+    """
+    stat_result = os.stat(file_path)
+    return _get_file_hash(file_path, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+async def get_output_path(
+    input_path: str,
+    *,
+    operation: str,
+    params: dict[str, Any] | None = None,
+    extension: str = ".geojson",
+) -> str:
+    """
+    Path of output of the operation with the params on the input file. The
+    path is derived from content of the input, so the same operation on the
+    same input has the same output path. Output is in directory of the input,
+    so it is removed together with the input. The input is hashed in thread,
+    not to block the event loop.
+    """
     file_dir = os.path.dirname(input_path)
-    out_name = f"{uuid.uuid4().hex}.geojson"
+    input_hash = await asyncio.to_thread(get_file_hash, input_path)
+    key = json.dumps([input_hash, operation, params or {}], sort_keys=True)
+    out_name = f"{hashlib.sha256(key.encode()).hexdigest()[:32]}{extension}"
     out_path = os.path.join(file_dir, out_name)
     return out_path
+
+
+async def ensure_output(
+    out_path: str, create: Callable[[str], Awaitable[T]]
+) -> T | None:
+    """
+    Create output file by awaiting create with temporary path next to
+    out_path, unless the output exists already. Output appears at out_path only
+    when it is complete. Returns result of create, None if output existed
+    already.
+    """
+    if os.path.exists(out_path):
+        logger.info(f"Reusing output {out_path}")
+        return None
+    out_name, out_ext = os.path.splitext(out_path)
+    # no dots are added to the name, GDAL and QGIS infer output format from
+    # its extension
+    tmp_path = f"{out_name}_{uuid.uuid4().hex}_tmp{out_ext}"
+    try:
+        result = await create(tmp_path)
+        os.replace(tmp_path, out_path)
+        return result
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,80 @@
+import asyncio
+import gzip
+import shutil
+from enum import StrEnum
+from typing import Awaitable, Callable, TypeVar
+
+import brotli
+
+from common.files import ensure_output
+
+T = TypeVar("T")
+
+# Output formats of conversion endpoints. Precompressed GeoJSON is stored
+# twice, as GeoJSON file and its compressed copy with extension of the
+# encoding next to it. URL of the GeoJSON file is returned, files service
+# serves the compressed copy instead if the client accepts its encoding.
+
+
+class OutputFormat(StrEnum):
+    GEOJSON = "geojson"
+    GEOJSON_GZIP = "geojson-gzip"  # precompressed by gzip
+    GEOJSON_BR = "geojson-br"  # precompressed by brotli
+    FLATGEOBUF = "flatgeobuf"  # with spatial index
+
+
+# extensions of compressed copies by content encoding, in order of preference
+PRECOMPRESSED_EXTENSIONS = {
+    "br": ".br",
+    "gzip": ".gz",
+}
+
+_CONTENT_ENCODINGS = {
+    OutputFormat.GEOJSON_GZIP: "gzip",
+    OutputFormat.GEOJSON_BR: "br",
+}
+
+
+def get_extension(output_format: OutputFormat) -> str:
+    return ".fgb" if output_format == OutputFormat.FLATGEOBUF else ".geojson"
+
+
+def get_ogr2ogr_options(output_format: OutputFormat) -> list[str]:
+    if output_format == OutputFormat.FLATGEOBUF:
+        return ["-f", "FlatGeobuf", "-lco", "SPATIAL_INDEX=YES"]
+    return ["-f", "GeoJSON"]
+
+
+def _compress(file_path: str, out_path: str, encoding: str):
+    with open(file_path, "rb") as file:
+        if encoding == "gzip":
+            # mtime=0 makes the output the same for the same input
+            with gzip.GzipFile(out_path, "wb", compresslevel=9, mtime=0) as out:
+                shutil.copyfileobj(file, out, 1024 * 1024)
+        else:
+            # quality 11 is several times slower for little smaller output
+            compressor = brotli.Compressor(quality=9)
+            with open(out_path, "wb") as out:
+                while chunk := file.read(1024 * 1024):
+                    out.write(compressor.process(chunk))
+                out.write(compressor.finish())
+
+
+async def ensure_output_in_format(
+    out_path: str,
+    output_format: OutputFormat,
+    create: Callable[[str], Awaitable[T]],
+) -> T | None:
+    """
+    The same as ensure_output, followed by creation of compressed copy of the
+    output if the format is precompressed. Extension of out_path must be the
+    one of get_extension.
+    """
+    result = await ensure_output(out_path, create)
+    encoding = _CONTENT_ENCODINGS.get(output_format)
+    if encoding is not None:
+        await ensure_output(
+            f"{out_path}{PRECOMPRESSED_EXTENSIONS[encoding]}",
+            lambda tmp_path: asyncio.to_thread(_compress, out_path, tmp_path, encoding),
+        )
+    return result
@@ -1,3 +1,5 @@
+import os
+from typing import Literal
 from urllib.parse import urlparse
 
 from pydantic import Field, HttpUrl, PostgresDsn, field_serializer
@@ -12,10 +14,20 @@ class Settings(BaseSettings):
     database_url: PostgresDsn = Field(
         alias="DATABASE_URL", default=PostgresDsn("postgresql://user@host:5432/dbname")
     )
+    # log every executed query with its parameters at INFO level, enabled in
+    # development by docker-compose.yml
+    database_log_queries: bool = False
+
+    # commands run by common.cmd.run_cmd_async
+    cmd_max_processes: int = os.cpu_count() or 1
+    cmd_timeout_seconds: int = 30 * 60
 
     # files
     static_files_url_path: str = "/static/files"
     files_dir_path: str = "/data/files"
+    # content-addressed blobs of uploaded files, outside of static files, but on
+    # the same filesystem as files_dir_path, so that files can be hard links
+    files_blobs_dir_path: str = "/data/blobs"
     supported_file_types: set[tuple[str, str, str, bool]] = {
         # extension, mime type, label, multiple?
         (".dxf", "application/octet-stream", "dxf", False),
@@ -27,9 +39,26 @@ class Settings(BaseSettings):
         "dxf": 7 * 24 * 60 * 60,  # 7 days
         "vfk": 2 * 60 * 60,  # 2 hours
     }
+    files_sweep_interval_seconds: int = 5 * 60
+    files_sweep_batch_size: int = 100  # directories removed at once
 
     # vfk
     internal_ogr2ogr_url: HttpUrl = HttpUrl("http://ogr2ogr:8000")
+    vfk_import_workers: int = 2  # number of VFK imports running at once
+    # native = streaming VFK parser with COPY, ogr2ogr = ogr2ogr service
+    vfk_import_loader: Literal["native", "ogr2ogr"] = "native"
+    # native loader copies VFK blocks concurrently if more than 1 process
+    vfk_import_processes: int = os.cpu_count() or 1
+    vfk_metadata_workers: int = 8  # number of VFK files inspected at once
+    # cache of title deed and ownership lookups, disabled if max size is 0
+    vfk_cache_max_size: int = 10_000
+    vfk_cache_ttl_seconds: int = 24 * 60 * 60  # 1 day
+    # SQLite file shared by processes of vfk service, process memory if None
+    vfk_cache_db_path: str | None = None
+    # parcel vector tiles of lower zoom levels are empty
+    vfk_tiles_min_zoom: int = 8
+    # cache of parcel vector tiles, outside of static files
+    vfk_tiles_dir_path: str = "/data/vfk/tiles"
 
     @field_serializer("database_url")
     def serialize_redacted_url(self, database_url: PostgresDsn):
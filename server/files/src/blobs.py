@@ -0,0 +1,66 @@
+import logging
+import os
+import uuid
+
+from common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed storage of uploaded files. Every distinct content is stored
+# once as a blob named by its SHA-256, files in upload directories are hard
+# links of blobs. References of blobs by upload directories are tracked in
+# table file_blob, blobs without references are removed by the sweeper. Blobs
+# are stored outside of static files, so they are served only through upload
+# directories until these expire.
+
+
+def get_blob_path(sha256: str) -> str:
+    return os.path.join(settings.files_blobs_dir_path, sha256[:2], sha256)
+
+
+def store_file(file_path: str, sha256: str):
+    """
+    Make the file a hard link of blob with its content. If there is no such
+    blob yet, the file becomes the blob.
+    """
+    blob_path = get_blob_path(sha256)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    while True:
+        try:
+            os.link(file_path, blob_path)
+            return
+        except FileExistsError:
+            pass
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(blob_path, tmp_path)
+        except FileNotFoundError:
+            # blob was removed by the sweeper in the meantime
+            continue
+        os.replace(tmp_path, file_path)
+        logger.info(f"Reusing blob {sha256} for {file_path}")
+        return
+
+
+def remove_blobs(sha256s: list[str]):
+    """
+    Remove blobs not linked by any file. Blob that was linked by store_file
+    since its references were checked is kept.
+    """
+    for sha256 in sha256s:
+        blob_path = get_blob_path(sha256)
+        # blob is moved aside first, so that no new link of it can be made
+        # between the check and the removal
+        tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.rename(blob_path, tmp_path)
+        except FileNotFoundError:
+            continue
+        if os.stat(tmp_path).st_nlink > 1:
+            logger.info(f"Keeping blob {sha256} linked in the meantime")
+            try:
+                os.link(tmp_path, blob_path)
+            except FileExistsError:
+                # store_file made another blob of the content in the meantime
+                pass
+        os.remove(tmp_path)
@@ -0,0 +1,13 @@
+-- migrate:up
+CREATE TABLE upload (
+  id SERIAL PRIMARY KEY,
+  uuid UUID UNIQUE NOT NULL,
+  file_uuid UUID NOT NULL REFERENCES file (uuid) ON DELETE CASCADE,
+  filename VARCHAR (255) NOT NULL,
+  size BIGINT NOT NULL,
+  sha256 VARCHAR (64),
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- migrate:down
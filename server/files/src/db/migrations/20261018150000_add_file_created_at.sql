@@ -0,0 +1,5 @@
+-- migrate:up
+ALTER TABLE file ADD COLUMN created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now();
+CREATE INDEX file_label_created_at_idx ON file (label, created_at);
+
+-- migrate:down
@@ -0,0 +1,11 @@
+-- migrate:up
+CREATE TABLE file_blob (
+  id SERIAL PRIMARY KEY,
+  file_uuid UUID NOT NULL REFERENCES file (uuid) ON DELETE CASCADE,
+  filename VARCHAR (255) NOT NULL,
+  sha256 VARCHAR (64) NOT NULL,
+  UNIQUE (file_uuid, filename)
+);
+CREATE INDEX file_blob_sha256_idx ON file_blob (sha256);
+
+-- migrate:down
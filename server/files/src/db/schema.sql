@@ -37,7 +37,8 @@ SET default_table_access_method = heap;
 CREATE TABLE files.file (
     id integer NOT NULL,
     uuid uuid NOT NULL,
-    label character varying(127) NOT NULL
+    label character varying(127) NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL
 );
 
 
@@ -65,6 +66,82 @@ ALTER SEQUENCE files.files_id_seq OWNER TO nemovid;
 ALTER SEQUENCE files.files_id_seq OWNED BY files.file.id;
 
 
+--
+-- Name: file_blob; Type: TABLE; Schema: files; Owner: nemovid
+--
+
+CREATE TABLE files.file_blob (
+    id integer NOT NULL,
+    file_uuid uuid NOT NULL,
+    filename character varying(255) NOT NULL,
+    sha256 character varying(64) NOT NULL
+);
+
+
+ALTER TABLE files.file_blob OWNER TO nemovid;
+
+--
+-- Name: file_blob_id_seq; Type: SEQUENCE; Schema: files; Owner: nemovid
+--
+
+CREATE SEQUENCE files.file_blob_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE files.file_blob_id_seq OWNER TO nemovid;
+
+--
+-- Name: file_blob_id_seq; Type: SEQUENCE OWNED BY; Schema: files; Owner: nemovid
+--
+
+ALTER SEQUENCE files.file_blob_id_seq OWNED BY files.file_blob.id;
+
+
+--
+-- Name: upload; Type: TABLE; Schema: files; Owner: nemovid
+--
+
+CREATE TABLE files.upload (
+    id integer NOT NULL,
+    uuid uuid NOT NULL,
+    file_uuid uuid NOT NULL,
+    filename character varying(255) NOT NULL,
+    size bigint NOT NULL,
+    sha256 character varying(64),
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    finished_at timestamp with time zone
+);
+
+
+ALTER TABLE files.upload OWNER TO nemovid;
+
+--
+-- Name: upload_id_seq; Type: SEQUENCE; Schema: files; Owner: nemovid
+--
+
+CREATE SEQUENCE files.upload_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE files.upload_id_seq OWNER TO nemovid;
+
+--
+-- Name: upload_id_seq; Type: SEQUENCE OWNED BY; Schema: files; Owner: nemovid
+--
+
+ALTER SEQUENCE files.upload_id_seq OWNED BY files.upload.id;
+
+
 --
 -- Name: file id; Type: DEFAULT; Schema: files; Owner: nemovid
 --
@@ -72,6 +149,20 @@ ALTER SEQUENCE files.files_id_seq OWNED BY files.file.id;
 ALTER TABLE ONLY files.file ALTER COLUMN id SET DEFAULT nextval('files.files_id_seq'::regclass);
 
 
+--
+-- Name: file_blob id; Type: DEFAULT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.file_blob ALTER COLUMN id SET DEFAULT nextval('files.file_blob_id_seq'::regclass);
+
+
+--
+-- Name: upload id; Type: DEFAULT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.upload ALTER COLUMN id SET DEFAULT nextval('files.upload_id_seq'::regclass);
+
+
 --
 -- Name: file files_pkey; Type: CONSTRAINT; Schema: files; Owner: nemovid
 --
@@ -88,6 +179,68 @@ ALTER TABLE ONLY files.file
     ADD CONSTRAINT files_uuid_key UNIQUE (uuid);
 
 
+--
+-- Name: file_blob file_blob_file_uuid_filename_key; Type: CONSTRAINT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.file_blob
+    ADD CONSTRAINT file_blob_file_uuid_filename_key UNIQUE (file_uuid, filename);
+
+
+--
+-- Name: file_blob file_blob_pkey; Type: CONSTRAINT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.file_blob
+    ADD CONSTRAINT file_blob_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: upload upload_pkey; Type: CONSTRAINT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.upload
+    ADD CONSTRAINT upload_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: upload upload_uuid_key; Type: CONSTRAINT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.upload
+    ADD CONSTRAINT upload_uuid_key UNIQUE (uuid);
+
+
+--
+-- Name: file_blob file_blob_file_uuid_fkey; Type: FK CONSTRAINT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.file_blob
+    ADD CONSTRAINT file_blob_file_uuid_fkey FOREIGN KEY (file_uuid) REFERENCES files.file(uuid) ON DELETE CASCADE;
+
+
+--
+-- Name: upload upload_file_uuid_fkey; Type: FK CONSTRAINT; Schema: files; Owner: nemovid
+--
+
+ALTER TABLE ONLY files.upload
+    ADD CONSTRAINT upload_file_uuid_fkey FOREIGN KEY (file_uuid) REFERENCES files.file(uuid) ON DELETE CASCADE;
+
+
+--
+-- Name: file_blob_sha256_idx; Type: INDEX; Schema: files; Owner: nemovid
+--
+
+CREATE INDEX file_blob_sha256_idx ON files.file_blob USING btree (sha256);
+
+
+--
+-- Name: file_label_created_at_idx; Type: INDEX; Schema: files; Owner: nemovid
+--
+
+CREATE INDEX file_label_created_at_idx ON files.file USING btree (label, created_at);
+
+
 --
 -- PostgreSQL database dump complete
 --
@@ -1,3 +1,6 @@
+import datetime
+from dataclasses import dataclass
+from typing import Optional
 from uuid import UUID
 
 from psycopg import sql
@@ -7,6 +10,8 @@ from common import db
 from common.settings import settings
 
 TABLE_NAME = "file"
+FILE_BLOB_TABLE_NAME = "file_blob"
+UPLOAD_TABLE_NAME = "upload"
 
 
 def run_query(query: Query, params: Params | None = None) -> list:
@@ -26,12 +31,32 @@ def insert_file(*, uuid: UUID, label: str):
     )
 
 
-def get_file_uuids(*, label: str) -> list[UUID]:
+def get_file_label(*, uuid: UUID) -> str | None:
     rows = run_query(
-        sql.SQL("SELECT uuid from {table} WHERE label = {label}").format(
+        sql.SQL("SELECT label from {table} WHERE uuid = %s").format(
             table=sql.Identifier(TABLE_NAME),
-            label=sql.Literal(label),
-        )
+        ),
+        (uuid,),
+    )
+    return rows[0][0] if rows else None
+
+
+def get_expired_file_uuids(*, label: str, ttl: int, limit: int) -> list[UUID]:
+    """
+    UUIDs of files of the label created more than ttl seconds ago, oldest
+    first.
+    """
+    rows = run_query(
+        sql.SQL("""
+SELECT uuid
+from {table}
+WHERE label = %s and created_at < now() - make_interval(secs => %s)
+order by created_at
+limit %s
+""").format(
+            table=sql.Identifier(TABLE_NAME),
+        ),
+        (label, ttl, limit),
     )
     result = []
     for row in rows:
@@ -41,6 +66,41 @@ def get_file_uuids(*, label: str) -> list[UUID]:
     return result
 
 
+def insert_file_blob(*, file_uuid: UUID, filename: str, sha256: str):
+    run_statement(
+        sql.SQL(
+            "INSERT INTO {table} (file_uuid, filename, sha256) VALUES (%s, %s, %s)"
+        ).format(
+            table=sql.Identifier(FILE_BLOB_TABLE_NAME),
+        ),
+        (file_uuid, filename, sha256),
+    )
+
+
+def get_blob_hashes(*, file_uuids: list[UUID]) -> list[str]:
+    rows = run_query(
+        sql.SQL("SELECT DISTINCT sha256 from {table} WHERE file_uuid = ANY(%s)").format(
+            table=sql.Identifier(FILE_BLOB_TABLE_NAME),
+        ),
+        (file_uuids,),
+    )
+    return [r[0] for r in rows]
+
+
+def get_unreferenced_blob_hashes(*, sha256s: list[str]) -> list[str]:
+    rows = run_query(
+        sql.SQL("""
+SELECT h.sha256
+from unnest(%s::varchar[]) as h(sha256)
+WHERE not exists (select 1 from {table} fb where fb.sha256 = h.sha256)
+""").format(
+            table=sql.Identifier(FILE_BLOB_TABLE_NAME),
+        ),
+        (sha256s,),
+    )
+    return [r[0] for r in rows]
+
+
 def delete_files_by_uuid(*, uuids: list[UUID]) -> None:
     run_statement(
         sql.SQL("DELETE FROM {table} WHERE uuid = ANY(%s)").format(
@@ -48,3 +108,81 @@ def delete_files_by_uuid(*, uuids: list[UUID]) -> None:
         ),
         (uuids,),
     )
+
+
+@dataclass(kw_only=True)
+class Upload:
+    uuid: UUID
+    file_uuid: UUID  # directory of the uploaded file
+    filename: str
+    size: int
+    sha256: Optional[str] = None  # checksum of whole file, expected until finished
+    created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+
+
+def insert_upload(
+    *,
+    uuid: UUID,
+    file_uuid: UUID,
+    filename: str,
+    size: int,
+    sha256: str | None,
+):
+    run_statement(
+        sql.SQL("""
+INSERT INTO {table} (uuid, file_uuid, filename, size, sha256)
+VALUES (%s, %s, %s, %s, %s)
+""").format(
+            table=sql.Identifier(UPLOAD_TABLE_NAME),
+        ),
+        (uuid, file_uuid, filename, size, sha256),
+    )
+
+
+def get_upload(*, uuid: UUID) -> Upload | None:
+    rows = run_query(
+        sql.SQL("""
+SELECT uuid, file_uuid, filename, size, sha256, created_at, finished_at
+from {table}
+where uuid = %s
+""").format(
+            table=sql.Identifier(UPLOAD_TABLE_NAME),
+        ),
+        (uuid,),
+    )
+    if not rows:
+        return None
+    uuid, file_uuid, filename, size, sha256, created_at, finished_at = rows[0]
+    return Upload(
+        uuid=uuid,
+        file_uuid=file_uuid,
+        filename=filename,
+        size=size,
+        sha256=sha256,
+        created_at=created_at,
+        finished_at=finished_at,
+    )
+
+
+def get_unfinished_upload_uuids(*, uuids: list[UUID]) -> list[UUID]:
+    rows = run_query(
+        sql.SQL(
+            "SELECT uuid from {table} WHERE uuid = ANY(%s) AND finished_at IS NULL"
+        ).format(
+            table=sql.Identifier(UPLOAD_TABLE_NAME),
+        ),
+        (uuids,),
+    )
+    return [r[0] for r in rows]
+
+
+def finish_upload(*, uuid: UUID, sha256: str):
+    run_statement(
+        sql.SQL(
+            "UPDATE {table} SET sha256 = %s, finished_at = now() WHERE uuid = %s"
+        ).format(
+            table=sql.Identifier(UPLOAD_TABLE_NAME),
+        ),
+        (sha256, uuid),
+    )
@@ -1,23 +1,41 @@
+import asyncio
+import hashlib
 import logging
 import os
 import shutil
-import time
 import uuid
 import zipfile
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from datetime import datetime
 from pathlib import Path
-from typing import Annotated, List, Optional
+from typing import Annotated, Any, List, Optional
+from uuid import UUID
 
-from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi import FastAPI, HTTPException, Request, UploadFile
 from fastapi import Path as FastApiPath
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
+from starlette.requests import ClientDisconnect
 
-from common.cmd import run_cmd
+import blobs
+import sweeper
 from common.files import file_path_to_static_url, static_url_to_file_path
 from common.settings import settings
 from db import util as db_util
+from static import PrecompressedStaticFiles
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper_task = asyncio.create_task(
+        sweeper.run_periodically(after_sweep=_forget_ended_uploads)
+    )
+    yield
+    sweeper_task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/api/files/v1/hello")
@@ -27,13 +45,14 @@ def get_hello():
 
 # Configuration
 MAX_FILE_SIZE_MB: int = 500
+UPLOAD_WRITE_SIZE: int = 1024 * 1024  # bytes of chunk written to file at once
 UPLOAD_DIRECTORY: str = settings.files_dir_path
 Path(UPLOAD_DIRECTORY).mkdir(parents=True, exist_ok=True)
 
 # Mount the static directory
 app.mount(
     settings.static_files_url_path,
-    StaticFiles(directory=UPLOAD_DIRECTORY),
+    PrecompressedStaticFiles(directory=UPLOAD_DIRECTORY),
     name="files",
 )
 
@@ -42,6 +61,9 @@ class ListedFile(BaseModel):
     filename: str
     url: str
     archived_file_paths: Optional[list[str]] = None
+    sha256: Optional[str] = Field(
+        default=None, description="SHA-256 of content of uploaded file"
+    )
 
 
 # Define response model
@@ -50,23 +72,20 @@ class PostFilesResponse(BaseModel):
     dirname: str
 
 
-def clean_up_old_files(*, label: str):
-    assert label in settings.files_ttl_by_label
-    files_ttl = settings.files_ttl_by_label[label]
-    now = time.time()
-    file_uuids = db_util.get_file_uuids(label=label)
-    uuids_to_remove_from_db = []
-    for file_uuid in file_uuids:
-        file_path = os.path.join(UPLOAD_DIRECTORY, file_uuid.hex)
-        if os.path.exists(file_path):
-            is_old = os.stat(file_path).st_mtime < now - files_ttl
-            if is_old:
-                uuids_to_remove_from_db.append(file_uuid)
-                print(f"Deleting old file: {file_path}")
-                run_cmd(f"rm -rf {file_path}")
-        else:
-            uuids_to_remove_from_db.append(file_uuid)
-    db_util.delete_files_by_uuid(uuids=uuids_to_remove_from_db)
+def check_supported_files(
+    *, label: str, content_types: list[Optional[str]], filenames: list[str]
+):
+    if not any(
+        (len(filenames) == 1 or supports_multiple)
+        and label == supported_label
+        and all(content_type == supported_mime for content_type in content_types)
+        and all(filename.endswith(supported_ext) for filename in filenames)
+        for supported_ext, supported_mime, supported_label, supports_multiple in settings.supported_file_types
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported combination of label, file types and names: {label} {content_types} {filenames}",
+        )
 
 
 @app.post(
@@ -110,25 +129,13 @@ async def post_files(label: str, files: list[UploadFile]):
     }
 
     # Validate file content type
-    if not any(
-        (len(files) == 1 or supports_multiple)
-        and label == supported_label
-        and all(file.content_type == supported_mime for file in files)
-        and all(
-            sanitized_filename.endswith(supported_ext)
-            for sanitized_filename in sanitized_filenames.values()
-        )
-        for supported_ext, supported_mime, supported_label, supports_multiple in settings.supported_file_types
-    ):
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported combination of label, file types and names: {label} {[file.content_type for file in files]} {sanitized_filenames.values()}",
-        )
+    check_supported_files(
+        label=label,
+        content_types=[file.content_type for file in files],
+        filenames=list(sanitized_filenames.values()),
+    )
 
     try:
-        if label in settings.files_ttl_by_label:
-            clean_up_old_files(label=label)
-
         # Generate a unique directory for the upload
         dir_uuid = uuid.uuid4()
         unique_directory_name = dir_uuid.hex
@@ -145,15 +152,21 @@ async def post_files(label: str, files: list[UploadFile]):
             file_path = unique_directory_path / sanitized_filename
 
             # Save the uploaded file
+            file_hash = hashlib.sha256()
             with file_path.open("wb") as buffer:
                 while chunk := file.file.read(1024 * 1024):
                     buffer.write(chunk)
+                    file_hash.update(chunk)
+            sha256 = file_hash.hexdigest()
+            _store_blob(dir_uuid, file_path, sha256)
 
             # Construct the public URL
             public_url = file_path_to_static_url(str(file_path))
 
             # Return response with public URL
-            listed_files.append(ListedFile(filename=sanitized_filename, url=public_url))
+            listed_files.append(
+                ListedFile(filename=sanitized_filename, url=public_url, sha256=sha256)
+            )
         return PostFilesResponse(files=listed_files, dirname=unique_directory_name)
 
     except Exception as e:
@@ -166,6 +179,340 @@ async def post_files(label: str, files: list[UploadFile]):
         )
 
 
+class CreateUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int = Field(ge=0, description="size of the whole file in bytes")
+    sha256: Optional[str] = Field(
+        default=None,
+        pattern="^[a-f0-9]{64}$",
+        description="SHA-256 of the whole file, verified when upload is finished",
+    )
+    dirname: Optional[str] = Field(
+        default=None,
+        pattern="^[a-f0-9]{32}$",
+        description="directory of previous upload of the same label to upload the file into, new directory if not set",
+    )
+
+
+class UploadState(BaseModel):
+    id: UUID
+    filename: str
+    dirname: str
+    size: int
+    offset: int = Field(description="number of bytes received so far")
+    finished: bool
+
+
+# upload UUID -> (number of hashed bytes, SHA-256 of them); kept in memory of
+# the process only, the file is hashed again when upload is finished if the
+# hash is missing
+_upload_hashes: dict[UUID, tuple[int, Any]] = {}
+_upload_locks: defaultdict[UUID, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+async def _forget_ended_uploads():
+    """
+    Drop state of uploads that were removed by the sweeper, e.g. abandoned
+    before they were finished, or finished by another process.
+    """
+    upload_ids = set(_upload_hashes) | set(_upload_locks)
+    if not upload_ids:
+        return
+    unfinished = await asyncio.to_thread(
+        db_util.get_unfinished_upload_uuids, uuids=list(upload_ids)
+    )
+    for upload_id in upload_ids - set(unfinished):
+        lock = _upload_locks.get(upload_id)
+        if lock is not None and lock.locked():
+            continue
+        _upload_locks.pop(upload_id, None)
+        _upload_hashes.pop(upload_id, None)
+
+
+def _get_upload_path(upload: db_util.Upload) -> Path:
+    return Path(UPLOAD_DIRECTORY) / upload.file_uuid.hex / upload.filename
+
+
+def _get_partial_upload_path(upload: db_util.Upload) -> Path:
+    # hidden, so that unfinished file is not listed nor imported
+    return Path(UPLOAD_DIRECTORY) / upload.file_uuid.hex / f".{upload.filename}.part"
+
+
+def _get_upload_state(upload: db_util.Upload) -> UploadState:
+    if upload.finished_at is not None:
+        offset = upload.size
+    else:
+        partial_path = _get_partial_upload_path(upload)
+        offset = partial_path.stat().st_size if partial_path.exists() else 0
+    return UploadState(
+        id=upload.uuid,
+        filename=upload.filename,
+        dirname=upload.file_uuid.hex,
+        size=upload.size,
+        offset=offset,
+        finished=upload.finished_at is not None,
+    )
+
+
+def _get_existing_upload(upload_id: UUID) -> db_util.Upload:
+    upload = db_util.get_upload(uuid=upload_id)
+    if (
+        upload is None
+        or not (
+            _get_upload_path(upload)
+            if upload.finished_at is not None
+            else _get_partial_upload_path(upload)
+        ).exists()
+    ):
+        raise HTTPException(status_code=404, detail="Upload does not exist")
+    return upload
+
+
+def _store_blob(dir_uuid: UUID, file_path: Path, sha256: str):
+    blobs.store_file(str(file_path), sha256)
+    db_util.insert_file_blob(file_uuid=dir_uuid, filename=file_path.name, sha256=sha256)
+
+
+def _hash_file(file_path: Path) -> str:
+    file_hash = hashlib.sha256()
+    with file_path.open("rb") as file:
+        while chunk := file.read(1024 * 1024):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+@app.post(
+    "/api/files/v1/uploads",
+    summary="Create resumable upload",
+    operation_id="create_upload",
+    status_code=201,
+    responses={
+        201: {"model": UploadState, "description": "Upload created"},
+        400: {"description": "Unsupported file"},
+        404: {"description": "Directory does not exist"},
+        409: {"description": "File already exists in directory"},
+        413: {"description": "File size exceeds limit"},
+    },
+)
+async def create_upload(label: str, upload_request: CreateUploadRequest):
+    """
+    Create upload of one file, which is then sent by chunks and finished.
+    Chunks are appended to hidden partial file, so upload interrupted by
+    dropped connection is resumed from its offset. The file appears in the
+    directory when the upload is finished.
+    """
+    if upload_request.size > MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail="File size exceeds limit.")
+
+    filename = Path(upload_request.filename).name
+    check_supported_files(
+        label=label,
+        content_types=[upload_request.content_type],
+        filenames=[filename],
+    )
+
+    if upload_request.dirname is not None:
+        dir_uuid = UUID(upload_request.dirname)
+        directory_path = Path(UPLOAD_DIRECTORY) / dir_uuid.hex
+        if db_util.get_file_label(uuid=dir_uuid) != label or not os.path.isdir(
+            directory_path
+        ):
+            raise HTTPException(status_code=404, detail="Directory does not exist")
+    else:
+        dir_uuid = uuid.uuid4()
+        directory_path = Path(UPLOAD_DIRECTORY) / dir_uuid.hex
+        directory_path.mkdir(parents=True, exist_ok=True)
+        db_util.insert_file(uuid=dir_uuid, label=label)
+
+    # partial file is reserved first, so that concurrent uploads of the same
+    # file can not both pass the check of the final file
+    partial_path = directory_path / f".{filename}.part"
+    try:
+        partial_path.touch(exist_ok=False)
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail="File already exists.")
+    if (directory_path / filename).exists():
+        partial_path.unlink()
+        raise HTTPException(status_code=409, detail="File already exists.")
+
+    upload_uuid = uuid.uuid4()
+    db_util.insert_upload(
+        uuid=upload_uuid,
+        file_uuid=dir_uuid,
+        filename=filename,
+        size=upload_request.size,
+        sha256=upload_request.sha256,
+    )
+    _upload_hashes[upload_uuid] = (0, hashlib.sha256())
+    upload = db_util.get_upload(uuid=upload_uuid)
+    assert upload is not None
+    return _get_upload_state(upload)
+
+
+@app.get(
+    "/api/files/v1/uploads/{upload_id}",
+    summary="State of resumable upload",
+    operation_id="get_upload",
+    responses={
+        200: {"model": UploadState, "description": "State of upload"},
+        404: {"description": "Upload does not exist"},
+    },
+)
+async def get_upload(upload_id: UUID):
+    return _get_upload_state(_get_existing_upload(upload_id))
+
+
+@app.put(
+    "/api/files/v1/uploads/{upload_id}",
+    summary="Upload chunk of file",
+    operation_id="put_upload_chunk",
+    responses={
+        200: {"model": UploadState, "description": "Chunk received"},
+        404: {"description": "Upload does not exist"},
+        409: {"description": "Offset does not match or upload is finished"},
+        413: {"description": "Chunk exceeds size of the file"},
+    },
+)
+async def put_upload_chunk(upload_id: UUID, offset: int, request: Request):
+    """
+    Append request body to the file. Offset must be equal to the number of
+    bytes received so far, which is returned also if connection was dropped
+    during previous chunk.
+    """
+    # 404 before lock of unknown upload is created
+    _get_existing_upload(upload_id)
+
+    async with _upload_locks[upload_id]:
+        upload = _get_existing_upload(upload_id)
+        if upload.finished_at is not None:
+            raise HTTPException(status_code=409, detail="Upload is finished.")
+        partial_path = _get_partial_upload_path(upload)
+        received = partial_path.stat().st_size
+        if offset != received:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Offset does not match, {received} bytes received so far.",
+            )
+        hashed_size, file_hash = _upload_hashes.pop(upload_id, (None, None))
+        if hashed_size != received:
+            file_hash = None
+        file = await asyncio.to_thread(partial_path.open, "ab")
+        # chunks of request are small, they are written in a thread in batches
+        buffer = bytearray()
+
+        def write_buffer() -> int:
+            try:
+                file.write(buffer)
+                if file_hash is not None:
+                    file_hash.update(buffer)
+                return len(buffer)
+            finally:
+                # not written again on failure, offset is then read from file
+                buffer.clear()
+
+        try:
+            async for chunk in request.stream():
+                if received + len(buffer) + len(chunk) > upload.size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail="Chunk exceeds size of the file.",
+                    )
+                buffer += chunk
+                if len(buffer) >= UPLOAD_WRITE_SIZE:
+                    received += await asyncio.to_thread(write_buffer)
+        except ClientDisconnect:
+            logging.info(
+                f"Upload {upload_id} interrupted at {received + len(buffer)} bytes"
+            )
+        finally:
+            try:
+                received += await asyncio.to_thread(write_buffer)
+            finally:
+                await asyncio.to_thread(file.close)
+            if file_hash is not None and partial_path.stat().st_size == received:
+                _upload_hashes[upload_id] = (received, file_hash)
+
+    return _get_upload_state(upload)
+
+
+@app.post(
+    "/api/files/v1/uploads/{upload_id}/finish",
+    summary="Finish resumable upload",
+    operation_id="finish_upload",
+    responses={
+        200: {"model": PostFilesResponse, "description": "File uploaded"},
+        400: {"description": "Checksum does not match, file must be sent again"},
+        404: {"description": "Upload does not exist"},
+        409: {"description": "Upload is not complete"},
+    },
+)
+async def finish_upload(upload_id: UUID):
+    upload = _get_existing_upload(upload_id)
+    upload_path = _get_upload_path(upload)
+
+    async with _upload_locks[upload_id]:
+        # concurrent request may have finished the upload in the meantime
+        upload = _get_existing_upload(upload_id)
+        if upload.finished_at is None:
+            partial_path = _get_partial_upload_path(upload)
+            received = partial_path.stat().st_size
+            if received != upload.size:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Upload is not complete, {received} of {upload.size} bytes received.",
+                )
+            hashed_size, file_hash = _upload_hashes.pop(upload_id, (None, None))
+            if file_hash is not None and hashed_size == received:
+                sha256 = file_hash.hexdigest()
+            else:
+                sha256 = await asyncio.to_thread(_hash_file, partial_path)
+            if upload.sha256 is not None and sha256 != upload.sha256:
+                os.truncate(partial_path, 0)
+                _upload_hashes[upload_id] = (0, hashlib.sha256())
+                raise HTTPException(
+                    status_code=400,
+                    detail="Checksum does not match, file must be sent again.",
+                )
+            os.replace(partial_path, upload_path)
+            _store_blob(upload.file_uuid, upload_path, sha256)
+            db_util.finish_upload(uuid=upload_id, sha256=sha256)
+            upload.sha256 = sha256
+    _upload_locks.pop(upload_id, None)
+
+    return PostFilesResponse(
+        files=[
+            ListedFile(
+                filename=upload.filename,
+                url=file_path_to_static_url(str(upload_path)),
+                sha256=upload.sha256,
+            )
+        ],
+        dirname=upload.file_uuid.hex,
+    )
+
+
+class SweeperStats(BaseModel):
+    runs: int
+    removed_files: int
+    last_run_at: Optional[datetime] = None
+    last_run_seconds: Optional[float] = None
+    last_removed_files: int = Field(description="number of files removed by last run")
+    last_error: Optional[str] = None
+
+
+@app.get(
+    "/api/files/v1/sweeper/stats",
+    summary="Statistics of removing old files",
+    operation_id="get_sweeper_stats",
+    responses={
+        200: {"model": SweeperStats, "description": "Statistics of sweeper"},
+    },
+)
+async def get_sweeper_stats():
+    return SweeperStats(**asdict(sweeper.get_stats()))
+
+
 @app.get(
     "/api/files/v1/directories/{directory_name}/list",
     summary="List files in directory",
@@ -188,8 +535,11 @@ async def list_directory_files(
     if not os.path.exists(directory_path) or not os.path.isdir(directory_path):
         raise HTTPException(status_code=404, detail="Directory does not exist")
 
+    # hidden files are partial files of unfinished uploads
     file_names = [
-        fn for fn in os.listdir(directory_path) if os.path.isfile(directory_path / fn)
+        fn
+        for fn in os.listdir(directory_path)
+        if not fn.startswith(".") and os.path.isfile(directory_path / fn)
     ]
     result: List[ListedFile] = []
     for file_name in file_names:
@@ -199,9 +549,12 @@ async def list_directory_files(
             filename=file_name, url=file_path_to_static_url(file_path)
         )
         if file_ext in {".zip"}:
-            with zipfile.ZipFile(file_path, "r") as zip_file:
-                archived_file_paths = zip_file.namelist()
-                result_item.archived_file_paths = archived_file_paths
+            try:
+                with zipfile.ZipFile(file_path, "r") as zip_file:
+                    archived_file_paths = zip_file.namelist()
+                    result_item.archived_file_paths = archived_file_paths
+            except zipfile.BadZipFile:
+                logging.warning(f"Listed file {file_path} is not valid ZIP file")
         result.append(result_item)
 
     return result
@@ -0,0 +1,60 @@
+import mimetypes
+import stat
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Scope
+
+from common.formats import PRECOMPRESSED_EXTENSIONS
+
+# Content type of compressed copies is guessed from the extension before the
+# one of the encoding, e.g. application/geo+json for .geojson.gz.
+mimetypes.add_type("application/vnd.flatgeobuf", ".fgb")
+
+
+def _get_accepted_encodings(headers: Headers) -> set[str]:
+    encodings = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        encoding, *params = (part.strip() for part in item.split(";"))
+        try:
+            quality = next(
+                (float(param[2:]) for param in params if param.startswith("q=")),
+                1.0,
+            )
+        except ValueError:
+            continue
+        if encoding and quality > 0:
+            encodings.add(encoding.lower())
+    return encodings
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    Static files serving compressed copy of the requested file, e.g.
+    file.geojson.br for file.geojson, with Content-Encoding header, if the copy
+    exists and the client accepts its encoding. See common.formats.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = None
+        if scope["method"] in ("GET", "HEAD"):
+            accepted_encodings = _get_accepted_encodings(Headers(scope=scope))
+            for encoding, extension in PRECOMPRESSED_EXTENSIONS.items():
+                if encoding not in accepted_encodings:
+                    continue
+                try:
+                    full_path, stat_result = await anyio.to_thread.run_sync(
+                        self.lookup_path, path + extension
+                    )
+                except (OSError, ValueError):
+                    break
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    response.headers["content-encoding"] = encoding
+                    break
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["vary"] = "Accept-Encoding"
+        return response
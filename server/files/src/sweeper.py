@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+from uuid import UUID
+
+import blobs
+from common.settings import settings
+from db import util as db_util
+
+logger = logging.getLogger(__name__)
+
+# Removes directories of files older than TTL of their label, see
+# settings.files_ttl_by_label, and blobs not referenced by any directory,
+# periodically in the background.
+
+
+@dataclass(kw_only=True)
+class SweeperStats:
+    runs: int = 0
+    removed_files: int = 0
+    last_run_at: Optional[datetime] = None
+    last_run_seconds: Optional[float] = None
+    last_removed_files: int = 0
+    last_error: Optional[str] = None
+
+
+_lock = threading.Lock()
+_stats = SweeperStats()
+
+
+def _remove_files(file_uuids: list[UUID]) -> None:
+    sha256s = db_util.get_blob_hashes(file_uuids=file_uuids)
+    for file_uuid in file_uuids:
+        file_path = os.path.join(settings.files_dir_path, file_uuid.hex)
+        logger.info(f"Deleting old file: {file_path}")
+        shutil.rmtree(file_path, ignore_errors=True)
+    db_util.delete_files_by_uuid(uuids=file_uuids)
+    # blobs are removed when the last directory referencing them is removed
+    blobs.remove_blobs(db_util.get_unreferenced_blob_hashes(sha256s=sha256s))
+
+
+def sweep() -> int:
+    """
+    Remove expired files of all labels in batches. Returns number of removed
+    files.
+    """
+    start = time.perf_counter()
+    removed = 0
+    error = None
+    try:
+        for label, ttl in settings.files_ttl_by_label.items():
+            while True:
+                file_uuids = db_util.get_expired_file_uuids(
+                    label=label, ttl=ttl, limit=settings.files_sweep_batch_size
+                )
+                if file_uuids:
+                    _remove_files(file_uuids)
+                    removed += len(file_uuids)
+                if len(file_uuids) < settings.files_sweep_batch_size:
+                    break
+    except Exception as e:
+        logger.error("Sweeping of old files failed", exc_info=True)
+        error = str(e)
+    with _lock:
+        _stats.runs += 1
+        _stats.removed_files += removed
+        _stats.last_run_at = datetime.now(timezone.utc)
+        _stats.last_run_seconds = time.perf_counter() - start
+        _stats.last_removed_files = removed
+        _stats.last_error = error
+    return removed
+
+
+async def run_periodically(after_sweep: Callable[[], Awaitable[None]] | None = None):
+    while True:
+        await asyncio.to_thread(sweep)
+        if after_sweep is not None:
+            try:
+                await after_sweep()
+            except Exception:
+                logger.error("Cleanup after sweeping failed", exc_info=True)
+        await asyncio.sleep(settings.files_sweep_interval_seconds)
+
+
+def get_stats() -> SweeperStats:
+    with _lock:
+        return SweeperStats(**vars(_stats))
@@ -0,0 +1,65 @@
+import asyncio
+import gzip
+import json
+import pathlib
+
+import brotli
+import pytest
+
+from common.formats import (
+    PRECOMPRESSED_EXTENSIONS,
+    OutputFormat,
+    ensure_output_in_format,
+    get_extension,
+)
+
+GEOJSON = json.dumps(
+    {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"id": i, "name": f"Parcela {i}"},
+                "geometry": {"type": "Point", "coordinates": [-740000 - i, -1040000]},
+            }
+            for i in range(10000)
+        ],
+    }
+).encode("utf-8")
+
+_DECOMPRESS = {
+    "gzip": gzip.decompress,
+    "br": brotli.decompress,
+}
+
+
+@pytest.mark.parametrize(
+    ("output_format", "encoding"),
+    [
+        (OutputFormat.GEOJSON_GZIP, "gzip"),
+        (OutputFormat.GEOJSON_BR, "br"),
+    ],
+)
+def test_compressed_copy_decompresses_to_output(tmp_path, output_format, encoding):
+    out_path = tmp_path / f"out{get_extension(output_format)}"
+
+    async def create(tmp_out_path: str):
+        pathlib.Path(tmp_out_path).write_bytes(GEOJSON)
+
+    asyncio.run(ensure_output_in_format(str(out_path), output_format, create))
+
+    compressed_path = tmp_path / f"{out_path.name}{PRECOMPRESSED_EXTENSIONS[encoding]}"
+    compressed = compressed_path.read_bytes()
+    assert len(compressed) < len(GEOJSON)
+    assert _DECOMPRESS[encoding](compressed) == out_path.read_bytes() == GEOJSON
+
+
+def test_geojson_has_no_compressed_copy(tmp_path):
+    out_path = tmp_path / "out.geojson"
+
+    async def create(tmp_out_path: str):
+        pathlib.Path(tmp_out_path).write_bytes(GEOJSON)
+
+    asyncio.run(ensure_output_in_format(str(out_path), OutputFormat.GEOJSON, create))
+
+    assert [p.name for p in tmp_path.iterdir()] == ["out.geojson"]
@@ -1,16 +1,28 @@
+import logging
+import time
 from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from pydantic import BaseModel, Field, HttpUrl
 
-from common.cmd import run_cmd
+from common.cmd import run_cmd_async, run_until_disconnected
+from common.dxf import DXF_CONFIG, DXF_OPTIONS
 from common.files import (
     file_path_to_static_url,
     get_output_path,
     static_url_to_file_path,
 )
+from common.formats import (
+    OutputFormat,
+    ensure_output_in_format,
+    get_extension,
+    get_ogr2ogr_options,
+)
 from common.settings import settings
 
+logger = logging.getLogger(__name__)
+
+
 app = FastAPI()
 
 
@@ -19,12 +31,32 @@ def get_hello():
     return {"Hello": "ogr2ogr", **settings.model_dump()}
 
 
+async def _translate(
+    dest: str, src: str, *, options: list[str], config: dict[str, str]
+) -> float:
+    """
+    Run ogr2ogr with the options and --config options. Returns duration in
+    seconds.
+    """
+    start = time.perf_counter()
+    config_args = [arg for kv in config.items() for arg in ("--config", *kv)]
+    await run_cmd_async(["ogr2ogr", dest, src, *options, *config_args])
+    seconds = time.perf_counter() - start
+    logger.info(f"{src} converted to {dest} in {seconds:.2f} s")
+    return seconds
+
+
 class DxfToGeojsonRequest(BaseModel):
     file_url: HttpUrl
+    output_format: OutputFormat = OutputFormat.GEOJSON
 
 
 class DxfToGeojsonResponse(BaseModel):
     file_url: HttpUrl
+    conversion_seconds: Optional[float] = Field(
+        description="duration of conversion, null if output of the same conversion was reused",
+        default=None,
+    )
 
 
 class FileUrl(BaseModel):
@@ -40,15 +72,31 @@ class FileUrl(BaseModel):
         200: {"model": DxfToGeojsonResponse, "description": "Success"},
     },
 )
-async def post_dxf_to_geojson(request: DxfToGeojsonRequest):
+async def post_dxf_to_geojson(request: DxfToGeojsonRequest, http_request: Request):
     file_path: str = static_url_to_file_path(request.file_url)
-    out_path = get_output_path(file_path)
+    options = [*get_ogr2ogr_options(request.output_format), *DXF_OPTIONS]
+    out_path = await get_output_path(
+        file_path,
+        operation="dxf-to-geojson",
+        params={"options": options, "config": DXF_CONFIG},
+        extension=get_extension(request.output_format),
+    )
 
-    run_cmd(
-        f"""ogr2ogr "{out_path}" "{file_path}" -f GeoJSON --config DXF_FEATURE_LIMIT_PER_BLOCK -1 -a_srs EPSG:5514 --config DXF_ENCODING utf-8 --config DXF_HATCH_TOLERANCE 2 -dim XY -dialect SQLITE -sql "SELECT * FROM entities WHERE LOWER(GeometryType(geometry)) LIKE '%polygon%'" """
+    conversion_seconds = await run_until_disconnected(
+        http_request,
+        ensure_output_in_format(
+            out_path,
+            request.output_format,
+            lambda tmp_path: _translate(
+                tmp_path, file_path, options=options, config=DXF_CONFIG
+            ),
+        ),
     )
 
-    result = DxfToGeojsonResponse(file_url=HttpUrl(file_path_to_static_url(out_path)))
+    result = DxfToGeojsonResponse(
+        file_url=HttpUrl(file_path_to_static_url(out_path)),
+        conversion_seconds=conversion_seconds,
+    )
     return result
 
 
@@ -64,17 +112,31 @@ class VfkToPostgisRequest(BaseModel):
     db_schema: str = Field(pattern=r"^[0-9a-zA-Z_]+$")
 
 
+class VfkToPostgisResponse(BaseModel):
+    conversion_seconds: float
+
+
 @app.post(
     "/api/ogr2ogr/v1/vfk-to-postgis",
     summary="VFK to PostGIS",
     operation_id="vfk_to_postgis",
     responses={
-        200: {},
+        200: {"model": VfkToPostgisResponse, "description": "Success"},
     },
 )
-async def post_vfk_to_postgis(request: VfkToPostgisRequest):
+async def post_vfk_to_postgis(request: VfkToPostgisRequest, http_request: Request):
     gdal_file_path: str = _file_url_to_gdal_path(request.file_url)
 
-    run_cmd(
-        f"""ogr2ogr -f PostgreSQL "{settings.database_url}" {gdal_file_path} --config OGR_VFK_DB_NAME {request.db_schema}.db --config OGR_VFK_DB_DELETE YES -lco SCHEMA={request.db_schema}"""
+    conversion_seconds = await run_until_disconnected(
+        http_request,
+        _translate(
+            str(settings.database_url),
+            gdal_file_path,
+            options=["-f", "PostgreSQL", "-lco", f"SCHEMA={request.db_schema}"],
+            config={
+                "OGR_VFK_DB_NAME": f"{request.db_schema}.db",
+                "OGR_VFK_DB_DELETE": "YES",
+            },
+        ),
     )
+    return VfkToPostgisResponse(conversion_seconds=conversion_seconds)
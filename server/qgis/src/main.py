@@ -1,12 +1,23 @@
-from fastapi import FastAPI
-from pydantic import BaseModel, HttpUrl
+import os
+import tempfile
+from typing import Optional
 
-from common.cmd import run_cmd
+from fastapi import FastAPI, Request
+from pydantic import BaseModel, Field, HttpUrl
+
+from common.cmd import run_cmd_async, run_until_disconnected
+from common.dxf import DXF_CONFIG, DXF_OPTIONS
 from common.files import (
     file_path_to_static_url,
     get_output_path,
     static_url_to_file_path,
 )
+from common.formats import (
+    OutputFormat,
+    ensure_output_in_format,
+    get_extension,
+    get_ogr2ogr_options,
+)
 from common.settings import settings
 
 app = FastAPI()
@@ -19,12 +30,25 @@ def get_hello():
 
 class FixGeometriesRequest(BaseModel):
     file_url: HttpUrl
+    output_format: OutputFormat = OutputFormat.GEOJSON
 
 
 class FixGeometriesResponse(BaseModel):
     file_url: HttpUrl
 
 
+def _get_qgis_process_cmd(algorithm_id: str, params: dict[str, str]) -> list[str]:
+    return [
+        "qgis_process",
+        "run",
+        algorithm_id,
+        "--distance_units=meters",
+        "--area_units=m2",
+        "--ellipsoid=EPSG:7004",
+        *(f"--{name}={value}" for name, value in params.items()),
+    ]
+
+
 @app.post(
     "/api/qgis/v1/fix-geometries",
     summary="Fix geometries",
@@ -33,13 +57,119 @@ class FixGeometriesResponse(BaseModel):
     },
     operation_id="fix_geometries",
 )
-async def fix_geometries(request: FixGeometriesRequest):
+async def fix_geometries(request: FixGeometriesRequest, http_request: Request):
     file_path: str = static_url_to_file_path(request.file_url)
-    out_path = get_output_path(file_path)
+    out_path = await get_output_path(
+        file_path,
+        operation="native:fixgeometries",
+        params={"METHOD": 0},
+        extension=get_extension(request.output_format),
+    )
+
+    async def create(tmp_path: str):
+        await run_cmd_async(
+            _get_qgis_process_cmd(
+                "native:fixgeometries",
+                {"INPUT": file_path, "METHOD": "0", "OUTPUT": tmp_path},
+            )
+        )
 
-    run_cmd(
-        f"""qgis_process run native:fixgeometries --distance_units=meters --area_units=m2 --ellipsoid=EPSG:7004 --INPUT="{file_path}" --METHOD=0 --OUTPUT="{out_path}" """
+    await run_until_disconnected(
+        http_request, ensure_output_in_format(out_path, request.output_format, create)
     )
 
     result = FixGeometriesResponse(file_url=HttpUrl(file_path_to_static_url(out_path)))
     return result
+
+
+class DxfToFixedGeojsonRequest(BaseModel):
+    file_url: HttpUrl
+    simplify_tolerance: Optional[float] = Field(
+        description="tolerance of simplification of geometries in meters, geometries are not simplified if null",
+        default=None,
+        gt=0,
+    )
+    output_format: OutputFormat = OutputFormat.GEOJSON
+
+
+class DxfToFixedGeojsonResponse(BaseModel):
+    file_url: HttpUrl
+
+
+# intermediate result of DXF pipeline is always GeoJSON
+DXF_TO_GEOJSON_OPTIONS = [*get_ogr2ogr_options(OutputFormat.GEOJSON), *DXF_OPTIONS]
+
+
+async def _run_dxf_pipeline(
+    dxf_path: str, out_path: str, simplify_tolerance: float | None
+):
+    # intermediate files are written to temporary directory
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        unsafe_path = os.path.join(tmp_dir, "unsafe.geojson")
+        fixed_path = (
+            out_path
+            if simplify_tolerance is None
+            else os.path.join(tmp_dir, "fixed.geojson")
+        )
+        config_args = [arg for kv in DXF_CONFIG.items() for arg in ("--config", *kv)]
+        await run_cmd_async(
+            ["ogr2ogr", unsafe_path, dxf_path, *DXF_TO_GEOJSON_OPTIONS, *config_args]
+        )
+        await run_cmd_async(
+            _get_qgis_process_cmd(
+                "native:fixgeometries",
+                {"INPUT": unsafe_path, "METHOD": "0", "OUTPUT": fixed_path},
+            )
+        )
+        if simplify_tolerance is not None:
+            await run_cmd_async(
+                _get_qgis_process_cmd(
+                    "native:simplifygeometries",
+                    {
+                        "INPUT": fixed_path,
+                        "METHOD": "0",
+                        "TOLERANCE": str(simplify_tolerance),
+                        "OUTPUT": out_path,
+                    },
+                )
+            )
+
+
+@app.post(
+    "/api/qgis/v1/dxf-to-fixed-geojson",
+    summary="DXF to GeoJSON with fixed geometries",
+    responses={
+        200: {"model": DxfToFixedGeojsonResponse, "description": "Success"},
+    },
+    operation_id="dxf_to_fixed_geojson",
+)
+async def dxf_to_fixed_geojson(
+    request: DxfToFixedGeojsonRequest, http_request: Request
+):
+    """
+    The same as dxf-to-geojson of ogr2ogr service followed by fix-geometries
+    and optional simplification, in one request without intermediate outputs
+    in static files.
+    """
+    file_path: str = static_url_to_file_path(request.file_url)
+    out_path = await get_output_path(
+        file_path,
+        operation="dxf-to-fixed-geojson",
+        params={
+            "options": DXF_TO_GEOJSON_OPTIONS,
+            "config": DXF_CONFIG,
+            "simplify_tolerance": request.simplify_tolerance,
+        },
+        extension=get_extension(request.output_format),
+    )
+
+    async def create(tmp_path: str):
+        await _run_dxf_pipeline(file_path, tmp_path, request.simplify_tolerance)
+
+    await run_until_disconnected(
+        http_request, ensure_output_in_format(out_path, request.output_format, create)
+    )
+
+    return DxfToFixedGeojsonResponse(
+        file_url=HttpUrl(file_path_to_static_url(out_path))
+    )
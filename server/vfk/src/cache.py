@@ -0,0 +1,239 @@
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable
+
+from common.settings import settings
+
+# Cache of results of lookups in imported VFK data. Keys start with
+# (kind, schema name, zoning code), so that results of an older import are never
+# returned, and are dropped when the zoning is imported again. Every
+# invalidation increments generation of the store, results looked up before the
+# invalidation are not stored afterwards.
+#
+# Functions block on SQLite store, async code calls them in a thread.
+
+CacheKey = tuple[str, str, int, Hashable]  # kind, schema name, zoning code, id
+
+
+@dataclass(kw_only=True)
+class CacheStats:
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+    ttl_seconds: int
+    backend: str
+
+
+class MemoryStore:
+    """
+    LRU of entries bounded by size, in memory of one process.
+    """
+
+    def __init__(self):
+        self._entries: OrderedDict[CacheKey, tuple[float, Any]] = OrderedDict()
+        self._generation = 0
+
+    def get_generation(self) -> int:
+        return self._generation
+
+    def get(self, key: CacheKey, now: float) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(
+        self,
+        items: dict[CacheKey, Any],
+        expires_at: float,
+        max_size: int,
+        generation: int,
+    ):
+        if generation != self._generation:
+            return
+        for key, value in items.items():
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+        while len(self._entries) > max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_zoning(self, zoning_code: int):
+        self._generation += 1
+        for key in [k for k in self._entries if k[2] == zoning_code]:
+            del self._entries[key]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SqliteStore:
+    """
+    LRU of entries bounded by size, in SQLite file shared by all processes of
+    the service on the host.
+    """
+
+    def __init__(self, db_path: str):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS entry (
+    key BLOB PRIMARY KEY,
+    zoning_code INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entry_zoning_code ON entry (zoning_code)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entry_accessed_at ON entry (accessed_at)"
+        )
+        # generation is shared by processes too, as they invalidate the store
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS generation (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    value INTEGER NOT NULL
+)""")
+        self._conn.execute("INSERT OR IGNORE INTO generation VALUES (0, 0)")
+        self._conn.commit()
+
+    def get_generation(self) -> int:
+        return self._conn.execute("SELECT value FROM generation").fetchone()[0]
+
+    def get(self, key: CacheKey, now: float) -> tuple[bool, Any]:
+        db_key = pickle.dumps(key)
+        with self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM entry WHERE key = ? AND expires_at > ?",
+                (db_key, now),
+            ).fetchone()
+            if row is None:
+                return False, None
+            self._conn.execute(
+                "UPDATE entry SET accessed_at = ? WHERE key = ?", (now, db_key)
+            )
+        return True, pickle.loads(row[0])
+
+    def set(
+        self,
+        items: dict[CacheKey, Any],
+        expires_at: float,
+        max_size: int,
+        generation: int,
+    ):
+        now = time.time()
+        with self._conn:
+            # lock the database, so that no process invalidates it until commit
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self.get_generation() != generation:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entry VALUES (?, ?, ?, ?, ?)",
+                [
+                    (pickle.dumps(key), key[2], pickle.dumps(value), expires_at, now)
+                    for key, value in items.items()
+                ],
+            )
+            self._conn.execute(
+                """
+DELETE FROM entry WHERE key IN (
+    SELECT key FROM entry ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+)""",
+                (max_size,),
+            )
+
+    def invalidate_zoning(self, zoning_code: int):
+        with self._conn:
+            self._conn.execute("UPDATE generation SET value = value + 1")
+            self._conn.execute(
+                "DELETE FROM entry WHERE zoning_code = ?", (zoning_code,)
+            )
+
+    def size(self) -> int:
+        return self._conn.execute("SELECT count(*) FROM entry").fetchone()[0]
+
+
+_lock = threading.Lock()
+_store: MemoryStore | SqliteStore | None = None
+_hits = 0
+_misses = 0
+
+
+def _get_store() -> MemoryStore | SqliteStore:
+    global _store
+    if _store is None:
+        if settings.vfk_cache_db_path:
+            _store = SqliteStore(settings.vfk_cache_db_path)
+        else:
+            _store = MemoryStore()
+    return _store
+
+
+def is_enabled() -> bool:
+    return settings.vfk_cache_max_size > 0 and settings.vfk_cache_ttl_seconds > 0
+
+
+def get_many(keys: list[CacheKey]) -> tuple[dict[CacheKey, Any], int]:
+    """
+    Returns values of keys that are cached and not expired, and generation of
+    the cache to pass to put_many with values looked up afterwards.
+    """
+    global _hits, _misses
+    if not is_enabled():
+        return {}, 0
+    with _lock:
+        store = _get_store()
+        generation = store.get_generation()
+        now = time.time()
+        values = {}
+        for key in keys:
+            found, value = store.get(key, now)
+            if found:
+                values[key] = value
+        _hits += len(values)
+        _misses += len(keys) - len(values)
+    return values, generation
+
+
+def put_many(items: dict[CacheKey, Any], *, generation: int):
+    """
+    Store values looked up when cache had the given generation. Values are
+    dropped if the cache was invalidated in the meantime.
+    """
+    if not is_enabled() or not items:
+        return
+    with _lock:
+        _get_store().set(
+            items,
+            time.time() + settings.vfk_cache_ttl_seconds,
+            settings.vfk_cache_max_size,
+            generation,
+        )
+
+
+def invalidate_zoning(zoning_code: int):
+    with _lock:
+        _get_store().invalidate_zoning(zoning_code)
+
+
+def get_stats() -> CacheStats:
+    with _lock:
+        return CacheStats(
+            hits=_hits,
+            misses=_misses,
+            size=_get_store().size() if is_enabled() else 0,
+            max_size=settings.vfk_cache_max_size,
+            ttl_seconds=settings.vfk_cache_ttl_seconds,
+            backend="sqlite" if settings.vfk_cache_db_path else "memory",
+        )
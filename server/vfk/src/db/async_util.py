@@ -0,0 +1,213 @@
+import asyncio
+import datetime
+from typing import AsyncIterator
+from uuid import UUID
+
+from psycopg.abc import Params, Query
+from psycopg.types.numeric import Int4, Int8
+
+import cache
+from common import async_db
+from common.settings import settings
+from db import util
+from db.util import (
+    CadastralImport,
+    ImportJob,
+    ParcelIntersection,
+    ParcelOwnerOverview,
+    TitleDeed,
+    TitleDeedOwnerOverview,
+    ValueErrors,
+)
+
+# Async variants of read-only functions of db.util, sharing their queries and
+# mapping of rows, for use in async endpoints without blocking the event loop.
+
+
+async def run_query(query: Query, params: Params | None = None) -> list:
+    return await async_db.run_query(query, params, db_uri=settings.database_url)
+
+
+async def run_prepared_query(query: Query, params: Params | None = None) -> list:
+    return await async_db.run_prepared_query(
+        query, params, db_uri=settings.database_url
+    )
+
+
+async def _get_cached_vfk_schema_names() -> dict[int, str]:
+    schema_names, generation = util.get_vfk_schema_names_cache()
+    if schema_names is None:
+        rows = await run_query(util.VFK_SCHEMA_NAMES_QUERY)
+        schema_names = util.set_vfk_schema_names_cache(rows, generation)
+    return schema_names
+
+
+async def _get_vfk_schema_name(*, zoning_id: int) -> str | None:
+    return (await _get_cached_vfk_schema_names()).get(zoning_id)
+
+
+async def get_vfk_imports() -> list[CadastralImport]:
+    return util.rows_to_vfk_imports(await run_query(util.VFK_IMPORTS_QUERY))
+
+
+async def get_import_file_identity(
+    zoning_id: str, valid_date: datetime.date
+) -> str | None:
+    return util.rows_to_import_file_identity(
+        await run_query(util.IMPORT_FILE_IDENTITY_QUERY, (zoning_id, valid_date))
+    )
+
+
+async def get_import_job(uuid: UUID) -> ImportJob | None:
+    return util.rows_to_import_job(await run_query(util.IMPORT_JOB_QUERY, (uuid,)))
+
+
+def _get_ownership_cache_key(
+    schema_name: str, zoning_code: int, title_deed_number: int
+) -> cache.CacheKey:
+    return ("title_deed_ownership", schema_name, zoning_code, title_deed_number)
+
+
+async def get_title_deeds_ownership(
+    title_deeds: dict[int, list[int]],
+) -> list[TitleDeedOwnerOverview]:
+    """
+    Ownership is cached by title deed, only title deeds missing in cache are
+    queried. Ordered by zoning in the order of title_deeds, then by title deed
+    ID.
+    """
+    if not title_deeds:
+        return []
+    schema_names = await _get_cached_vfk_schema_names()
+    cache_keys: list[cache.CacheKey] = []
+    for zoning_code, title_deed_numbers in title_deeds.items():
+        schema_name = schema_names.get(zoning_code)
+        if not schema_name:
+            raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
+        cache_keys.extend(
+            _get_ownership_cache_key(schema_name, zoning_code, number)
+            for number in dict.fromkeys(title_deed_numbers)
+        )
+    cached, generation = await asyncio.to_thread(cache.get_many, cache_keys)
+
+    # (zoning code, title deed number) -> ownership
+    results: dict[tuple[int, int], list[TitleDeedOwnerOverview]] = {}
+    missing: dict[int, list[int]] = {}
+    for zoning_code, title_deed_numbers in title_deeds.items():
+        for number in dict.fromkeys(title_deed_numbers):
+            key = _get_ownership_cache_key(
+                schema_names[zoning_code], zoning_code, number
+            )
+            if key in cached:
+                results[(zoning_code, number)] = cached[key]
+            else:
+                missing.setdefault(zoning_code, []).append(number)
+
+    if missing:
+        query, params = util.get_title_deeds_ownership_query(missing, schema_names)
+        rows = await run_prepared_query(query, params)
+        for zoning_code, title_deed_numbers in missing.items():
+            for number in title_deed_numbers:
+                results[(zoning_code, number)] = []
+        for row in rows:
+            ownership = util.row_to_title_deed_owner_overview(row)
+            results[(ownership.zoning_code, ownership.title_deed_number)].append(
+                ownership
+            )
+        await asyncio.to_thread(
+            cache.put_many,
+            {
+                _get_ownership_cache_key(
+                    schema_names[zoning_code], zoning_code, number
+                ): results[(zoning_code, number)]
+                for zoning_code, title_deed_numbers in missing.items()
+                for number in title_deed_numbers
+            },
+            generation=generation,
+        )
+
+    return [
+        ownership
+        for zoning_code, title_deed_numbers in title_deeds.items()
+        for ownership in sorted(
+            (
+                ownership
+                for number in dict.fromkeys(title_deed_numbers)
+                for ownership in results[(zoning_code, number)]
+            ),
+            key=lambda ownership: ownership.title_deed_id,
+        )
+    ]
+
+
+async def iter_title_deeds_ownership(
+    title_deeds: dict[int, list[int]],
+) -> AsyncIterator[TitleDeedOwnerOverview]:
+    """
+    Like get_title_deeds_ownership, but rows are streamed from server-side
+    cursor, bypassing the cache. Zoning schemas are resolved immediately.
+    """
+    query, params = util.get_title_deeds_ownership_query(
+        title_deeds, await _get_cached_vfk_schema_names()
+    )
+
+    async def iter_results():
+        if not title_deeds:
+            return
+        async for row in async_db.iter_query(
+            query, params, db_uri=settings.database_url
+        ):
+            yield util.row_to_title_deed_owner_overview(row)
+
+    return iter_results()
+
+
+async def get_parcels_ownership(
+    parcel_ids: dict[int, list[int]],
+) -> list[ParcelOwnerOverview]:
+    if not parcel_ids:
+        return []
+    query, params = util.get_parcels_ownership_query(
+        parcel_ids, await _get_cached_vfk_schema_names()
+    )
+    rows = await run_prepared_query(query, params)
+    return [util.row_to_parcel_owner_overview(row) for row in rows]
+
+
+async def get_parcels_intersection(geojson: str) -> list[ParcelIntersection]:
+    schema_names = sorted((await _get_cached_vfk_schema_names()).values())
+    if not schema_names:
+        return []
+    rows = await run_query(
+        util.get_parcels_intersection_query(schema_names), (geojson,)
+    )
+    return [util.row_to_parcel_intersection(row) for row in rows]
+
+
+async def get_parcel_tile(z: int, x: int, y: int) -> bytes:
+    schema_names = sorted((await _get_cached_vfk_schema_names()).values())
+    if not schema_names:
+        return b""
+    rows = await run_prepared_query(
+        util.get_parcel_tile_query(schema_names), (Int4(z), Int4(x), Int4(y))
+    )
+    return rows[0][0] or b""
+
+
+async def get_zoning_title_deed(
+    zoning_code: int, title_deed_number: int
+) -> tuple[TitleDeed | None, datetime.date]:
+    schema_name = await _get_vfk_schema_name(zoning_id=zoning_code)
+    if not schema_name:
+        raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
+    cache_key = ("title_deed", schema_name, zoning_code, title_deed_number)
+    cached, generation = await asyncio.to_thread(cache.get_many, [cache_key])
+    if cache_key in cached:
+        return cached[cache_key]
+    rows = await run_prepared_query(
+        util.get_zoning_title_deed_query(schema_name),
+        (Int8(zoning_code), Int8(title_deed_number)),
+    )
+    result = util.rows_to_zoning_title_deed(rows, schema_name)
+    await asyncio.to_thread(cache.put_many, {cache_key: result}, generation=generation)
+    return result
@@ -0,0 +1,487 @@
+import itertools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from typing import Any, Callable, Iterable, LiteralString
+
+from psycopg import Connection, sql
+
+import vfkfile
+from common import db
+from common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SRID = 5514
+GEOMETRY_COLUMN = "wkb_geometry"  # the same name as ogr2ogr uses
+CHUNK_SIZE = 50_000  # data lines copied by one worker process at once
+
+
+def _column_type(column: vfkfile.VfkColumn) -> sql.Composable:
+    if column.pg_type == "text" and column.text_width > 0:
+        return sql.SQL("varchar({width})").format(width=sql.Literal(column.text_width))
+    return sql.SQL(column.pg_type)
+
+
+def create_block_table(conn: Connection, schema_name: str, block: vfkfile.VfkBlock):
+    conn.execute(
+        sql.SQL("CREATE TABLE {table} (ogc_fid SERIAL PRIMARY KEY, {columns})").format(
+            table=sql.Identifier(schema_name, block.table_name),
+            columns=sql.SQL(", ").join(
+                sql.SQL("{name} {type}").format(
+                    name=sql.Identifier(column.name),
+                    type=_column_type(column),
+                )
+                for column in block.columns
+            ),
+        )
+    )
+
+
+def copy_block_rows(
+    conn: Connection,
+    schema_name: str,
+    block: vfkfile.VfkBlock,
+    rows: Iterable[list[Any]],
+) -> int:
+    row_count = 0
+    with conn.cursor() as cur:
+        with cur.copy(
+            sql.SQL("COPY {table} ({columns}) FROM STDIN (FORMAT BINARY)").format(
+                table=sql.Identifier(schema_name, block.table_name),
+                columns=sql.SQL(", ").join(
+                    sql.Identifier(column.name) for column in block.columns
+                ),
+            )
+        ) as copy:
+            copy.set_types([column.pg_type for column in block.columns])
+            for row in rows:
+                copy.write_row(row)
+                row_count += 1
+    return row_count
+
+
+def _add_geometry_column(
+    conn: Connection,
+    schema_name: str,
+    table_name: str,
+    geometry_type: LiteralString,
+):
+    conn.execute(
+        sql.SQL(
+            "ALTER TABLE {table} ADD COLUMN {column} geometry({type}, {srid})"
+        ).format(
+            table=sql.Identifier(schema_name, table_name),
+            column=sql.Identifier(GEOMETRY_COLUMN),
+            type=sql.SQL(geometry_type),
+            srid=sql.Literal(SRID),
+        )
+    )
+
+
+def build_geometries(conn: Connection, schema_name: str, table_names: set[str]):
+    """
+    Build geometries of points (SOBR), boundary lines (HP) and parcels (PAR) from
+    coordinates and topology tables, similarly to GDAL VFK driver. Arcs of
+    boundary lines are stored as straight segments between their points.
+    """
+    tables = {
+        name: sql.Identifier(schema_name, name) for name in ("sobr", "sbp", "hp", "par")
+    }
+    geom = sql.Identifier(GEOMETRY_COLUMN)
+
+    if "sobr" not in table_names:
+        return
+    _add_geometry_column(conn, schema_name, "sobr", "Point")
+    conn.execute(
+        sql.SQL("""
+UPDATE {sobr}
+SET {geom} = ST_SetSRID(ST_MakePoint(-souradnice_y, -souradnice_x), {srid})
+""").format(**tables, geom=geom, srid=sql.Literal(SRID))
+    )
+
+    if not {"sbp", "hp"} <= table_names:
+        return
+    _add_geometry_column(conn, schema_name, "hp", "LineString")
+    conn.execute(
+        sql.SQL("""
+UPDATE {hp} hp
+SET {geom} = line.geom
+FROM (
+    SELECT sbp.hp_id, ST_MakeLine(sobr.{geom} ORDER BY sbp.poradove_cislo_bodu) geom
+    FROM {sbp} sbp
+             INNER JOIN {sobr} sobr ON (sobr.id = sbp.bp_id)
+    WHERE sbp.hp_id IS NOT NULL
+    GROUP BY sbp.hp_id
+) line
+WHERE line.hp_id = hp.id
+""").format(**tables, geom=geom)
+    )
+
+    if "par" not in table_names:
+        return
+    _add_geometry_column(conn, schema_name, "par", "MultiPolygon")
+    conn.execute(
+        sql.SQL("""
+UPDATE {par} par
+SET {geom} = ST_Multi(area.geom)
+FROM (
+    SELECT boundary.par_id, ST_BuildArea(ST_Collect(boundary.geom)) geom
+    FROM (
+        SELECT par_id_1 par_id, {geom} geom FROM {hp} WHERE par_id_1 IS NOT NULL
+        UNION ALL
+        SELECT par_id_2 par_id, {geom} geom FROM {hp} WHERE par_id_2 IS NOT NULL
+    ) boundary
+    GROUP BY boundary.par_id
+) area
+WHERE area.par_id = par.id
+""").format(**tables, geom=geom)
+    )
+
+
+def _load_blocks(
+    schema_name: str,
+    file_path: str,
+    archived_file_path: str | None,
+    on_read: Callable[[memoryview], None] | None,
+) -> dict[str, int]:
+    row_counts: dict[str, int] = {}
+    pool = db.get_connection_pool(db_uri=settings.database_url)
+    with vfkfile.open_vfk_file(
+        file_path, archived_file_path, on_read=on_read
+    ) as vfk_file:
+        with pool.connection() as conn, conn.transaction():
+            for block, lines in vfkfile.iter_blocks(vfkfile.iter_lines(vfk_file)):
+                if block.table_name not in row_counts:
+                    create_block_table(conn, schema_name, block)
+                    row_counts[block.table_name] = 0
+                row_counts[block.table_name] += copy_block_rows(
+                    conn, schema_name, block, vfkfile.parse_rows(block, lines)
+                )
+                logger.info(
+                    f"{schema_name}.{block.table_name}: {row_counts[block.table_name]} rows"
+                )
+    return row_counts
+
+
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn, so that connection pools of parent process are not inherited
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.vfk_import_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _copy_chunk(schema_name: str, block: vfkfile.VfkBlock, lines: list[str]) -> int:
+    # run in worker process, one connection is enough for it
+    pool = db.get_connection_pool(db_uri=settings.database_url, min_size=1)
+    with pool.connection() as conn, conn.transaction():
+        return copy_block_rows(
+            conn, schema_name, block, vfkfile.parse_rows(block, lines)
+        )
+
+
+def _load_blocks_in_parallel(
+    schema_name: str,
+    file_path: str,
+    archived_file_path: str | None,
+    on_read: Callable[[memoryview], None] | None,
+) -> dict[str, int]:
+    """
+    Split VFK file by blocks and chunks of data lines and copy them concurrently
+    in worker processes, each with its own connection.
+    """
+    process_pool = _get_process_pool()
+    max_pending_chunks = 2 * settings.vfk_import_processes
+    row_counts: dict[str, int] = {}
+    pending: dict[Future[int], str] = {}
+
+    def collect(return_when: str):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            row_counts[pending.pop(future)] += future.result()
+
+    pool = db.get_connection_pool(db_uri=settings.database_url)
+    try:
+        with vfkfile.open_vfk_file(
+            file_path, archived_file_path, on_read=on_read
+        ) as vfk_file:
+            with pool.connection() as conn:
+                for block, lines in vfkfile.iter_blocks(vfkfile.iter_lines(vfk_file)):
+                    if block.table_name not in row_counts:
+                        # committed, so that worker processes see the table
+                        with conn.transaction():
+                            create_block_table(conn, schema_name, block)
+                        row_counts[block.table_name] = 0
+                    while chunk := list(itertools.islice(lines, CHUNK_SIZE)):
+                        if len(pending) >= max_pending_chunks:
+                            collect(FIRST_COMPLETED)
+                        future = process_pool.submit(
+                            _copy_chunk, schema_name, block, chunk
+                        )
+                        pending[future] = block.table_name
+        collect(ALL_COMPLETED)
+    finally:
+        for future in pending:
+            future.cancel()
+        wait(pending)
+    for table_name, row_count in row_counts.items():
+        logger.info(f"{schema_name}.{table_name}: {row_count} rows")
+    return row_counts
+
+
+def load_vfk_file(
+    schema_name: str,
+    file_path: str,
+    archived_file_path: str | None,
+    *,
+    with_geometries: bool = True,
+    on_read: Callable[[memoryview], None] | None = None,
+) -> dict[str, int]:
+    """
+    Load all blocks of VFK file into tables of existing empty schema using binary
+    COPY, without any intermediate file. Returns number of rows by table.
+    Content of the file is read once, chunks are passed also to on_read, e.g.
+    to compute hash of the content.
+    """
+    if settings.vfk_import_processes > 1:
+        row_counts = _load_blocks_in_parallel(
+            schema_name, file_path, archived_file_path, on_read
+        )
+    else:
+        row_counts = _load_blocks(schema_name, file_path, archived_file_path, on_read)
+    if with_geometries:
+        pool = db.get_connection_pool(db_uri=settings.database_url)
+        with pool.connection() as conn, conn.transaction():
+            build_geometries(conn, schema_name, set(row_counts))
+    return row_counts
+
+
+def _get_tables_columns(conn: Connection, schema_name: str) -> dict[str, list[str]]:
+    rows = conn.execute(
+        """
+SELECT table_name, column_name
+from information_schema.columns
+where table_schema = %s
+order by table_name, ordinal_position
+""",
+        (schema_name,),
+    ).fetchall()
+    columns: dict[str, list[str]] = {}
+    for table_name, column_name in rows:
+        columns.setdefault(table_name, []).append(column_name)
+    return columns
+
+
+def _update_changed_geometries(
+    conn: Connection,
+    schema_name: str,
+    changes_schema_name: str,
+    changed_tables: set[str],
+):
+    """
+    Rebuild geometries of inserted rows and of boundary lines and parcels whose
+    points or boundary lines changed, the same way as build_geometries does.
+    """
+    names = {
+        **{
+            name: sql.Identifier(schema_name, name)
+            for name in ("sobr", "sbp", "hp", "par")
+        },
+        **{
+            f"changed_{name}": sql.Identifier(changes_schema_name, name)
+            for name in ("sobr", "sbp", "hp")
+        },
+        "geom": sql.Identifier(GEOMETRY_COLUMN),
+        "srid": sql.Literal(SRID),
+    }
+
+    conn.execute(
+        sql.SQL("""
+UPDATE {sobr}
+SET {geom} = ST_SetSRID(ST_MakePoint(-souradnice_y, -souradnice_x), {srid})
+WHERE {geom} IS NULL
+""").format(**names)
+    )
+
+    hp_id_queries = [sql.SQL("SELECT id FROM {hp} WHERE {geom} IS NULL")]
+    if "sbp" in changed_tables:
+        hp_id_queries.append(
+            sql.SQL("SELECT hp_id FROM {changed_sbp} WHERE hp_id IS NOT NULL")
+        )
+    if "sobr" in changed_tables:
+        hp_id_queries.append(
+            sql.SQL("""
+SELECT sbp.hp_id
+FROM {sbp} sbp
+         INNER JOIN {changed_sobr} sobr ON (sobr.id = sbp.bp_id)
+WHERE sbp.hp_id IS NOT NULL""")
+        )
+    conn.execute(
+        sql.SQL(
+            "CREATE TEMPORARY TABLE changed_hp_id ON COMMIT DROP AS {query}"
+        ).format(
+            query=sql.SQL(" UNION ").join(q.format(**names) for q in hp_id_queries)
+        )
+    )
+    conn.execute(
+        sql.SQL("""
+UPDATE {hp} hp
+SET {geom} = line.geom
+FROM (
+    SELECT sbp.hp_id, ST_MakeLine(sobr.{geom} ORDER BY sbp.poradove_cislo_bodu) geom
+    FROM {sbp} sbp
+             INNER JOIN {sobr} sobr ON (sobr.id = sbp.bp_id)
+    WHERE sbp.hp_id IN (SELECT id FROM changed_hp_id)
+    GROUP BY sbp.hp_id
+) line
+WHERE line.hp_id = hp.id
+""").format(**names)
+    )
+
+    par_id_queries = [
+        sql.SQL("SELECT id FROM {par} WHERE {geom} IS NULL"),
+        sql.SQL("""
+SELECT unnest(ARRAY[par_id_1, par_id_2])
+FROM {hp}
+WHERE id IN (SELECT id FROM changed_hp_id)"""),
+    ]
+    if "hp" in changed_tables:
+        # parcels of removed boundary lines too
+        par_id_queries.append(
+            sql.SQL("SELECT unnest(ARRAY[par_id_1, par_id_2]) FROM {changed_hp}")
+        )
+    conn.execute(
+        sql.SQL("""
+UPDATE {par} par
+SET {geom} = ST_Multi(area.geom)
+FROM (
+    SELECT boundary.par_id, ST_BuildArea(ST_Collect(boundary.geom)) geom
+    FROM (
+        SELECT par_id_1 par_id, {geom} geom FROM {hp} WHERE par_id_1 IS NOT NULL
+        UNION ALL
+        SELECT par_id_2 par_id, {geom} geom FROM {hp} WHERE par_id_2 IS NOT NULL
+    ) boundary
+    WHERE boundary.par_id IN ({par_id_query})
+    GROUP BY boundary.par_id
+) area
+WHERE area.par_id = par.id
+""").format(
+            **names,
+            par_id_query=sql.SQL(" UNION ").join(
+                q.format(**names) for q in par_id_queries
+            ),
+        )
+    )
+
+
+# lines whose points are listed in SBP, exactly one of them is set in SBP row
+_SBP_LINE_COLUMNS = ("hp_id", "ob_id", "dpm_id", "op_id", "obbp_id", "hbpej_id")
+
+
+def _get_change_keys(table_name: str, change_columns: list[str]) -> list[list[str]]:
+    """
+    Columns identifying rows of the table, rows are matched by any of the keys.
+    Rows are identified by ID (or code of code lists), points of lines (SBP) by
+    the line and the order of the point.
+    """
+    for key_column in ("id", "kod"):
+        if key_column in change_columns:
+            return [[key_column]]
+    if table_name == "sbp":
+        return [
+            [line_column, "poradove_cislo_bodu"]
+            for line_column in _SBP_LINE_COLUMNS
+            if line_column in change_columns
+        ]
+    return []
+
+
+def apply_vfk_changes(
+    conn: Connection, schema_name: str, changes_schema_name: str
+) -> dict[str, int]:
+    """
+    Apply rows of VFK change file loaded in changes schema to tables of existing
+    schema. Rows are matched by keys of _get_change_keys, existing rows are
+    deleted and rows not ended (without DATUM_ZANIKU) are inserted again.
+    Returns number of applied change rows by table. Must be run in transaction.
+    Raises ValueError if changes of some table can not be matched.
+    """
+    tables_columns = _get_tables_columns(conn, schema_name)
+    changes_columns = _get_tables_columns(conn, changes_schema_name)
+    applied: dict[str, int] = {}
+    for table_name, change_columns in changes_columns.items():
+        if table_name not in tables_columns:
+            logger.warning(f"Skipping changes of table {table_name} not imported")
+            continue
+        keys = _get_change_keys(table_name, change_columns)
+        if not keys:
+            raise ValueError(f"Changes of table {table_name} can not be matched")
+        columns = [
+            sql.Identifier(column)
+            for column in change_columns
+            if column in tables_columns[table_name]
+            and column not in {"ogc_fid", GEOMETRY_COLUMN}
+        ]
+        fmt = {
+            "table": sql.Identifier(schema_name, table_name),
+            "changes": sql.Identifier(changes_schema_name, table_name),
+            "columns": sql.SQL(", ").join(columns),
+        }
+        for key in keys:
+            conn.execute(
+                sql.SQL("DELETE FROM {table} t USING {changes} c WHERE {match}").format(
+                    **fmt,
+                    match=sql.SQL(" AND ").join(
+                        sql.SQL("t.{column} = c.{column}").format(
+                            column=sql.Identifier(column)
+                        )
+                        for column in key
+                    ),
+                )
+            )
+        not_ended = (
+            sql.SQL("WHERE datum_zaniku IS NULL")
+            if "datum_zaniku" in change_columns
+            else sql.SQL("")
+        )
+        conn.execute(
+            sql.SQL(
+                "INSERT INTO {table} ({columns}) SELECT {columns} FROM {changes} {not_ended}"
+            ).format(**fmt, not_ended=not_ended)
+        )
+        row = conn.execute(
+            sql.SQL("SELECT count(*) FROM {changes}").format(**fmt)
+        ).fetchone()
+        applied[table_name] = row[0] if row else 0
+        logger.info(f"{schema_name}.{table_name}: {applied[table_name]} changes")
+
+    with_geometry = {
+        table_name
+        for table_name, columns in tables_columns.items()
+        if GEOMETRY_COLUMN in columns
+    }
+    if {"sobr", "hp", "par"} <= with_geometry and "sbp" in tables_columns:
+        _update_changed_geometries(conn, schema_name, changes_schema_name, set(applied))
+    return applied
+
+
+def shutdown():
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,21 @@
+-- migrate:up
+CREATE TABLE import_job (
+  id SERIAL PRIMARY KEY,
+  uuid UUID UNIQUE NOT NULL,
+  zoning_id VARCHAR (6) NOT NULL,
+  valid_date DATE NOT NULL,
+  file_url TEXT NOT NULL,
+  archived_file_path TEXT,
+  phase VARCHAR (31) NOT NULL,
+  row_counts JSONB,
+  error TEXT,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  started_at TIMESTAMP WITH TIME ZONE,
+  finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- at most one unfinished import per zoning
+CREATE UNIQUE INDEX import_job_unfinished_zoning_id_key
+  ON import_job (zoning_id) WHERE finished_at IS NULL;
+
+-- migrate:down
@@ -0,0 +1,4 @@
+-- migrate:up
+ALTER TABLE import_job ADD COLUMN index_seconds DOUBLE PRECISION;
+
+-- migrate:down
@@ -0,0 +1,36 @@
+-- migrate:up
+CREATE TABLE import (
+  id SERIAL PRIMARY KEY,
+  zoning_id VARCHAR (6) UNIQUE NOT NULL,
+  zoning_name VARCHAR (255) NOT NULL,
+  valid_date DATE NOT NULL,
+  schema_name VARCHAR (63) UNIQUE NOT NULL,
+  row_counts JSONB,
+  import_seconds DOUBLE PRECISION,
+  imported_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- catalog schemas imported so far
+DO $$
+DECLARE
+  vfk_schema record;
+BEGIN
+  FOR vfk_schema IN
+    SELECT schema_name
+    FROM information_schema.schemata
+    WHERE schema_name ~ '^ku\d{6}_\d{8}$'
+  LOOP
+    EXECUTE format(
+      'INSERT INTO import (zoning_id, zoning_name, valid_date, schema_name) '
+      'SELECT %L, nazev, %L, %L FROM %I.katuze WHERE kod = %s '
+      'ON CONFLICT DO NOTHING',
+      substr(vfk_schema.schema_name, 3, 6),
+      to_date(substr(vfk_schema.schema_name, 10, 8), 'YYYYMMDD'),
+      vfk_schema.schema_name,
+      vfk_schema.schema_name,
+      substr(vfk_schema.schema_name, 3, 6)
+    );
+  END LOOP;
+END $$;
+
+-- migrate:down
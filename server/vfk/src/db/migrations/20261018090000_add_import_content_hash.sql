@@ -0,0 +1,4 @@
+-- migrate:up
+ALTER TABLE import ADD COLUMN content_hash VARCHAR (64);
+
+-- migrate:down
@@ -0,0 +1,5 @@
+-- migrate:up
+ALTER TABLE import ADD COLUMN file_identity VARCHAR (255);
+
+-- migrate:down
+
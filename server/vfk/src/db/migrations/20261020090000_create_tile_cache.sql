@@ -0,0 +1,9 @@
+-- migrate:up
+CREATE TABLE tile_cache (
+  id INTEGER PRIMARY KEY CHECK (id = 0),
+  generation INTEGER NOT NULL
+);
+
+INSERT INTO tile_cache (id, generation) VALUES (0, 0);
+
+-- migrate:down
@@ -0,0 +1,205 @@
+--
+-- PostgreSQL database dump
+--
+
+-- Dumped from database version 17.5 (Debian 17.5-1.pgdg110+1)
+-- Dumped by pg_dump version 17.5 (Debian 17.5-1.pgdg110+1)
+
+SET statement_timeout = 0;
+SET lock_timeout = 0;
+SET idle_in_transaction_session_timeout = 0;
+SET transaction_timeout = 0;
+SET client_encoding = 'UTF8';
+SET standard_conforming_strings = on;
+SELECT pg_catalog.set_config('search_path', '', false);
+SET check_function_bodies = false;
+SET xmloption = content;
+SET client_min_messages = warning;
+SET row_security = off;
+
+--
+-- Name: vfk; Type: SCHEMA; Schema: -; Owner: nemovid
+--
+
+CREATE SCHEMA vfk;
+
+
+ALTER SCHEMA vfk OWNER TO nemovid;
+
+SET default_tablespace = '';
+
+SET default_table_access_method = heap;
+
+--
+-- Name: import; Type: TABLE; Schema: vfk; Owner: nemovid
+--
+
+CREATE TABLE vfk.import (
+    id integer NOT NULL,
+    zoning_id character varying(6) NOT NULL,
+    zoning_name character varying(255) NOT NULL,
+    valid_date date NOT NULL,
+    schema_name character varying(63) NOT NULL,
+    row_counts jsonb,
+    import_seconds double precision,
+    imported_at timestamp with time zone DEFAULT now() NOT NULL,
+    content_hash character varying(64),
+    file_identity character varying(255)
+);
+
+
+ALTER TABLE vfk.import OWNER TO nemovid;
+
+--
+-- Name: import_id_seq; Type: SEQUENCE; Schema: vfk; Owner: nemovid
+--
+
+CREATE SEQUENCE vfk.import_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE vfk.import_id_seq OWNER TO nemovid;
+
+--
+-- Name: import_id_seq; Type: SEQUENCE OWNED BY; Schema: vfk; Owner: nemovid
+--
+
+ALTER SEQUENCE vfk.import_id_seq OWNED BY vfk.import.id;
+
+
+--
+-- Name: import_job; Type: TABLE; Schema: vfk; Owner: nemovid
+--
+
+CREATE TABLE vfk.import_job (
+    id integer NOT NULL,
+    uuid uuid NOT NULL,
+    zoning_id character varying(6) NOT NULL,
+    valid_date date NOT NULL,
+    file_url text NOT NULL,
+    archived_file_path text,
+    phase character varying(31) NOT NULL,
+    row_counts jsonb,
+    error text,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    started_at timestamp with time zone,
+    finished_at timestamp with time zone,
+    index_seconds double precision
+);
+
+
+ALTER TABLE vfk.import_job OWNER TO nemovid;
+
+--
+-- Name: import_job_id_seq; Type: SEQUENCE; Schema: vfk; Owner: nemovid
+--
+
+CREATE SEQUENCE vfk.import_job_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE vfk.import_job_id_seq OWNER TO nemovid;
+
+--
+-- Name: import_job_id_seq; Type: SEQUENCE OWNED BY; Schema: vfk; Owner: nemovid
+--
+
+ALTER SEQUENCE vfk.import_job_id_seq OWNED BY vfk.import_job.id;
+
+
+--
+-- Name: tile_cache; Type: TABLE; Schema: vfk; Owner: nemovid
+--
+
+CREATE TABLE vfk.tile_cache (
+    id integer NOT NULL,
+    generation integer NOT NULL,
+    CONSTRAINT tile_cache_id_check CHECK ((id = 0))
+);
+
+
+ALTER TABLE vfk.tile_cache OWNER TO nemovid;
+
+--
+-- Name: import id; Type: DEFAULT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.import ALTER COLUMN id SET DEFAULT nextval('vfk.import_id_seq'::regclass);
+
+
+--
+-- Name: import_job id; Type: DEFAULT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.import_job ALTER COLUMN id SET DEFAULT nextval('vfk.import_job_id_seq'::regclass);
+
+
+--
+-- Name: import import_pkey; Type: CONSTRAINT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.import
+    ADD CONSTRAINT import_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: import import_schema_name_key; Type: CONSTRAINT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.import
+    ADD CONSTRAINT import_schema_name_key UNIQUE (schema_name);
+
+
+--
+-- Name: import import_zoning_id_key; Type: CONSTRAINT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.import
+    ADD CONSTRAINT import_zoning_id_key UNIQUE (zoning_id);
+
+
+--
+-- Name: import_job import_job_pkey; Type: CONSTRAINT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.import_job
+    ADD CONSTRAINT import_job_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: import_job import_job_uuid_key; Type: CONSTRAINT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.import_job
+    ADD CONSTRAINT import_job_uuid_key UNIQUE (uuid);
+
+
+--
+-- Name: tile_cache tile_cache_pkey; Type: CONSTRAINT; Schema: vfk; Owner: nemovid
+--
+
+ALTER TABLE ONLY vfk.tile_cache
+    ADD CONSTRAINT tile_cache_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: import_job_unfinished_zoning_id_key; Type: INDEX; Schema: vfk; Owner: nemovid
+--
+
+CREATE UNIQUE INDEX import_job_unfinished_zoning_id_key ON vfk.import_job USING btree (zoning_id) WHERE (finished_at IS NULL);
+
+
+--
+-- PostgreSQL database dump complete
+--
+
@@ -1,26 +1,58 @@
 import datetime
+import logging
+import time
 from dataclasses import dataclass
 from enum import StrEnum
-from typing import Optional
+from typing import Iterator, Optional
+from uuid import UUID
 
 from psycopg import sql
 from psycopg.abc import Params, Query
+from psycopg.types.json import Jsonb
+from psycopg.types.numeric import Int8
 
+import tiles
 from common import db
 from common.settings import settings
+from db import load as db_load
 
 
 def run_query(query: Query, params: Params | None = None) -> list:
     return db.run_query(query, params, db_uri=settings.database_url)
 
 
+def run_prepared_query(query: Query, params: Params | None = None) -> list:
+    return db.run_prepared_query(query, params, db_uri=settings.database_url)
+
+
 def run_statement(query: Query, params: Params | None = None):
     return db.run_statement(query, params, db_uri=settings.database_url)
 
 
+logger = logging.getLogger(__name__)
+
+IMPORT_TABLE_NAME = "import"
+IMPORT_JOB_TABLE_NAME = "import_job"
+
+# B-tree indexes of VFK tables used by queries of this module, (table, columns)
+VFK_INDEXES: list[tuple[str, tuple[str, ...]]] = [
+    ("katuze", ("kod",)),
+    ("tel", ("katuze_kod", "cislo_tel")),
+    ("par", ("id",)),
+    ("par", ("tel_id",)),
+    ("vla", ("tel_id",)),
+    ("vla", ("opsub_id",)),
+    ("opsub", ("id",)),
+    ("charos", ("kod",)),
+    ("typrav", ("kod",)),
+    ("zdpaze", ("kod",)),
+]
+
+
 class ValueErrors(StrEnum):
     ZONING_SCHEMA_NOT_FOUND = "Zoning schema not found"
     MORE_TITLE_DEEDS_FOUND = "More title deeds found"
+    CHANGES_NOT_CONTIGUOUS = "Changes do not follow valid date of imported zoning"
 
 
 @dataclass(kw_only=True)
@@ -59,69 +91,123 @@ order by schema_name
     return [r[0] for r in rows]
 
 
+# zoning id -> schema name, loaded from catalog of imports
+_vfk_schema_names_cache: dict[int, str] | None = None
+_vfk_schema_names_cache_generation = 0
+
+
+def invalidate_vfk_schema_name_cache():
+    global _vfk_schema_names_cache, _vfk_schema_names_cache_generation
+    _vfk_schema_names_cache_generation += 1
+    _vfk_schema_names_cache = None
+
+
+VFK_SCHEMA_NAMES_QUERY = sql.SQL("SELECT zoning_id, schema_name from {table}").format(
+    table=sql.Identifier(IMPORT_TABLE_NAME),
+)
+
+
+def get_vfk_schema_names_cache() -> tuple[dict[int, str] | None, int]:
+    return _vfk_schema_names_cache, _vfk_schema_names_cache_generation
+
+
+def set_vfk_schema_names_cache(rows: list, generation: int) -> dict[int, str]:
+    global _vfk_schema_names_cache
+    schema_names = {int(r[0]): r[1] for r in rows}
+    # do not cache result of query that raced with invalidation
+    if generation == _vfk_schema_names_cache_generation:
+        _vfk_schema_names_cache = schema_names
+    return schema_names
+
+
+def _get_cached_vfk_schema_names() -> dict[int, str]:
+    schema_names, generation = get_vfk_schema_names_cache()
+    if schema_names is None:
+        rows = run_query(VFK_SCHEMA_NAMES_QUERY)
+        schema_names = set_vfk_schema_names_cache(rows, generation)
+    return schema_names
+
+
 def _get_vfk_schema_name(*, zoning_id: int) -> str | None:
-    assert settings.database_url.path is not None
-    rows = run_query(
-        sql.SQL(r"""
-SELECT schema_name
-from information_schema.schemata
-where catalog_name=%s and schema_owner=%s and schema_name ~ '^ku\d{6}_\d{8}$' and starts_with(schema_name, %s)
-order by schema_name
-"""),
-        (
-            settings.database_url.path[1:],
-            settings.database_url.hosts()[0]["username"],
-            f"ku{zoning_id}_",
-        ),
-    )
-    return None if not rows else rows[0][0]
+    return _get_cached_vfk_schema_names().get(zoning_id)
 
 
-def get_vfk_imports() -> list[CadastralImport]:
-    schema_names = _get_vfk_schema_names()
-    if not schema_names:
-        return []
+VFK_IMPORTS_QUERY = sql.SQL("""
+SELECT zoning_id, zoning_name, valid_date
+from {table}
+order by zoning_id
+""").format(
+    table=sql.Identifier(IMPORT_TABLE_NAME),
+)
 
-    zoning_dates: dict[str, datetime.date] = {}
 
-    for schema_name in schema_names:
-        zoning_id, valid_date = _schema_to_id_and_date(schema_name)
-        zoning_dates[zoning_id] = valid_date
+def rows_to_vfk_imports(rows: list) -> list[CadastralImport]:
+    return [
+        CadastralImport(
+            zoning_id=zoning_id, zoning_name=zoning_name, valid_date=valid_date
+        )
+        for zoning_id, zoning_name, valid_date in rows
+    ]
 
-    rows = run_query(
-        sql.SQL(" UNION ALL ").join(
-            sql.Composed(
-                [
-                    sql.SQL(r"""
-(
-SELECT {kukod}, nazev
-from {katuze}
-where kod={kukod}
+
+def get_vfk_imports() -> list[CadastralImport]:
+    return rows_to_vfk_imports(run_query(VFK_IMPORTS_QUERY))
+
+
+IMPORT_CONTENT_HASH_QUERY = sql.SQL("""
+SELECT content_hash
+from {table}
+where zoning_id = %s and valid_date = %s
+""").format(
+    table=sql.Identifier(IMPORT_TABLE_NAME),
 )
+
+
+def rows_to_import_content_hash(rows: list) -> str | None:
+    return rows[0][0] if rows else None
+
+
+def get_import_content_hash(zoning_id: str, valid_date: datetime.date) -> str | None:
+    """
+    Hash of content of VFK file of imported zoning valid at the date, None if
+    the zoning is not imported at the date or the hash is not known.
+    """
+    return rows_to_import_content_hash(
+        run_query(IMPORT_CONTENT_HASH_QUERY, (zoning_id, valid_date))
+    )
+
+
+IMPORT_FILE_IDENTITY_QUERY = sql.SQL("""
+SELECT file_identity
+from {table}
+where zoning_id = %s and valid_date = %s
 """).format(
-                        katuze=sql.Identifier(
-                            get_schema_name(zoning_id, valid_date), "katuze"
-                        ),
-                        kukod=sql.Literal(int(zoning_id)),
-                    )
-                    for zoning_id, valid_date in zoning_dates.items()
-                ]
-            )
-        )
+    table=sql.Identifier(IMPORT_TABLE_NAME),
+)
+
+
+def rows_to_import_file_identity(rows: list) -> str | None:
+    return rows[0][0] if rows else None
+
+
+def get_import_file_identity(zoning_id: str, valid_date: datetime.date) -> str | None:
+    """
+    Cheap identity of VFK file of imported zoning valid at the date, see
+    vfkfile.get_archived_file_identity, None if the zoning is not imported at the date
+    or the identity is not known.
+    """
+    return rows_to_import_file_identity(
+        run_query(IMPORT_FILE_IDENTITY_QUERY, (zoning_id, valid_date))
     )
 
-    result = []
-    for row in rows:
-        zoning_id = f"{row[0]}"
-        zoning_name = row[1]
-        import_date = zoning_dates[zoning_id]
-        result.append(
-            CadastralImport(
-                zoning_id=zoning_id, valid_date=import_date, zoning_name=zoning_name
-            )
-        )
 
-    return result
+def set_import_file_identity(zoning_id: str, file_identity: str):
+    run_statement(
+        sql.SQL("UPDATE {table} SET file_identity = %s WHERE zoning_id = %s").format(
+            table=sql.Identifier(IMPORT_TABLE_NAME)
+        ),
+        (file_identity, zoning_id),
+    )
 
 
 def ensure_empty_tmp_vfk_schema(zoning_id: str, valid_date: datetime.date):
@@ -134,7 +220,28 @@ def ensure_empty_tmp_vfk_schema(zoning_id: str, valid_date: datetime.date):
     )
 
 
-def set_tmp_vfk_schema_as_main(zoning_id: str, valid_date: datetime.date):
+def drop_tmp_vfk_schema(zoning_id: str, valid_date: datetime.date):
+    schema_name = get_schema_name(zoning_id, valid_date, tmp=True)
+    run_statement(
+        sql.SQL("DROP SCHEMA IF EXISTS {vfkschema} CASCADE").format(
+            vfkschema=sql.Identifier(schema_name)
+        )
+    )
+
+
+def set_tmp_vfk_schema_as_main(
+    zoning_id: str,
+    valid_date: datetime.date,
+    *,
+    row_counts: dict[str, int] | None = None,
+    import_seconds: float | None = None,
+    content_hash: str | None = None,
+    file_identity: str | None = None,
+):
+    """
+    Replace schema of the zoning by temporary schema and record it in catalog
+    of imports, in one transaction.
+    """
     tmp_schema_name = get_schema_name(zoning_id, valid_date, tmp=True)
     schema_name = get_schema_name(zoning_id, valid_date)
     existing_schemas = _get_vfk_schema_names()
@@ -157,9 +264,333 @@ def set_tmp_vfk_schema_as_main(zoning_id: str, valid_date: datetime.date):
     """).format(
                     vfkschema=sql.Identifier(schema_name),
                     tmpvfkschema=sql.Identifier(tmp_schema_name),
-                )
+                ),
+                sql.SQL("""
+    INSERT INTO {table} (zoning_id, zoning_name, valid_date, schema_name, row_counts, import_seconds, content_hash, file_identity)
+    SELECT %(zoning_id)s, nazev, %(valid_date)s, %(schema_name)s, %(row_counts)s, %(import_seconds)s, %(content_hash)s, %(file_identity)s
+    from {katuze}
+    where kod = %(zoning_code)s
+    ON CONFLICT (zoning_id) DO UPDATE
+    SET zoning_name = excluded.zoning_name,
+        valid_date = excluded.valid_date,
+        schema_name = excluded.schema_name,
+        row_counts = excluded.row_counts,
+        import_seconds = excluded.import_seconds,
+        content_hash = excluded.content_hash,
+        file_identity = excluded.file_identity,
+        imported_at = now();
+    """).format(
+                    table=sql.Identifier(IMPORT_TABLE_NAME),
+                    katuze=sql.Identifier(schema_name, "katuze"),
+                ),
             ]
+        ),
+        {
+            "zoning_id": zoning_id,
+            "zoning_code": int(zoning_id),
+            "valid_date": valid_date,
+            "schema_name": schema_name,
+            "row_counts": Jsonb(row_counts) if row_counts is not None else None,
+            "import_seconds": import_seconds,
+            "content_hash": content_hash,
+            "file_identity": file_identity,
+        },
+    )
+    invalidate_vfk_schema_name_cache()
+
+
+def apply_tmp_vfk_changes(
+    zoning_id: str, valid_from: datetime.date, valid_date: datetime.date
+) -> dict[str, int]:
+    """
+    Apply VFK change file loaded in temporary schema to schema of the zoning,
+    rename it to the new valid date and record it in catalog of imports, in one
+    transaction. Changes must follow valid date of the imported zoning.
+    Returns number of applied change rows by table.
+    """
+    tmp_schema_name = get_schema_name(zoning_id, valid_date, tmp=True)
+    new_schema_name = get_schema_name(zoning_id, valid_date)
+    pool = db.get_connection_pool(db_uri=settings.database_url)
+    with pool.connection() as conn, conn.transaction():
+        row = conn.execute(
+            sql.SQL(
+                "SELECT schema_name, valid_date from {table} where zoning_id = %s FOR UPDATE"
+            ).format(table=sql.Identifier(IMPORT_TABLE_NAME)),
+            (zoning_id,),
+        ).fetchone()
+        if row is None:
+            raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
+        schema_name, current_valid_date = row
+        if current_valid_date != valid_from:
+            raise ValueError(ValueErrors.CHANGES_NOT_CONTIGUOUS)
+
+        applied = db_load.apply_vfk_changes(conn, schema_name, tmp_schema_name)
+
+        if new_schema_name != schema_name:
+            conn.execute(
+                sql.SQL("ALTER SCHEMA {schema} RENAME TO {new_schema}").format(
+                    schema=sql.Identifier(schema_name),
+                    new_schema=sql.Identifier(new_schema_name),
+                )
+            )
+        conn.execute(
+            sql.SQL("DROP SCHEMA {tmp_schema} CASCADE").format(
+                tmp_schema=sql.Identifier(tmp_schema_name)
+            )
         )
+        conn.execute(
+            sql.SQL("""
+UPDATE {table}
+SET valid_date = %s, schema_name = %s, content_hash = NULL, file_identity = NULL,
+    imported_at = now()
+WHERE zoning_id = %s
+""").format(table=sql.Identifier(IMPORT_TABLE_NAME)),
+            (valid_date, new_schema_name, zoning_id),
+        )
+    invalidate_vfk_schema_name_cache()
+    return applied
+
+
+def get_schema_row_counts(schema_name: str) -> dict[str, int]:
+    rows = run_query(
+        sql.SQL("""
+SELECT table_name
+from information_schema.tables
+where table_schema=%s and table_type='BASE TABLE'
+order by table_name
+"""),
+        (schema_name,),
+    )
+    table_names = [r[0] for r in rows]
+    if not table_names:
+        return {}
+    rows = run_query(
+        sql.SQL(" UNION ALL ").join(
+            sql.SQL("(SELECT {table_name}, count(*) from {table})").format(
+                table_name=sql.Literal(table_name),
+                table=sql.Identifier(schema_name, table_name),
+            )
+            for table_name in table_names
+        )
+    )
+    return {r[0]: r[1] for r in rows}
+
+
+def _get_schema_columns(schema_name: str) -> set[tuple[str, str]]:
+    rows = run_query(
+        sql.SQL("""
+SELECT table_name, column_name
+from information_schema.columns
+where table_schema=%s
+"""),
+        (schema_name,),
+    )
+    return {(r[0], r[1]) for r in rows}
+
+
+def _get_geometry_columns_without_index(schema_name: str) -> list[tuple[str, str]]:
+    rows = run_query(
+        sql.SQL("""
+SELECT gc.f_table_name, gc.f_geometry_column
+from public.geometry_columns gc
+where gc.f_table_schema=%s and not exists (
+    select 1
+    from pg_indexes i
+    where i.schemaname = gc.f_table_schema
+      and i.tablename = gc.f_table_name
+      and i.indexdef ilike '%%using gist%%'
+)
+order by gc.f_table_name
+"""),
+        (schema_name,),
+    )
+    return [(r[0], r[1]) for r in rows]
+
+
+def build_vfk_schema_indexes(schema_name: str) -> float:
+    """
+    Create B-tree indexes of VFK_INDEXES, GiST indexes of geometry columns and
+    collect statistics of all tables of the schema. Tables or columns missing in
+    the schema are skipped. Returns duration in seconds.
+    """
+    start = time.perf_counter()
+    schema_columns = _get_schema_columns(schema_name)
+    statements: list[sql.Composed] = []
+    for table_name, column_names in VFK_INDEXES:
+        if not all((table_name, c) in schema_columns for c in column_names):
+            continue
+        statements.append(
+            sql.SQL("CREATE INDEX {name} ON {table} ({columns});").format(
+                name=sql.Identifier(f"{table_name}_{'_'.join(column_names)}_idx"),
+                table=sql.Identifier(schema_name, table_name),
+                columns=sql.SQL(", ").join(map(sql.Identifier, column_names)),
+            )
+        )
+    for table_name, column_name in _get_geometry_columns_without_index(schema_name):
+        statements.append(
+            sql.SQL("CREATE INDEX {name} ON {table} USING GIST ({column});").format(
+                name=sql.Identifier(f"{table_name}_{column_name}_idx"),
+                table=sql.Identifier(schema_name, table_name),
+                column=sql.Identifier(column_name),
+            )
+        )
+    for table_name in sorted({table_name for table_name, _ in schema_columns}):
+        statements.append(
+            sql.SQL("ANALYZE {table};").format(
+                table=sql.Identifier(schema_name, table_name)
+            )
+        )
+    for statement in statements:
+        run_statement(statement)
+    duration = time.perf_counter() - start
+    logger.info(f"{schema_name}: indexes and statistics built in {duration:.1f} s")
+    return duration
+
+
+class ImportJobPhase(StrEnum):
+    QUEUED = "queued"
+    LOADING = "loading"
+    INDEXING = "indexing"
+    SWAPPING = "swapping"
+    APPLYING = "applying"  # changes of VFK change file
+    DONE = "done"
+    CURRENT = "current"  # the same file was already imported, nothing to do
+    FAILED = "failed"
+
+
+FINAL_IMPORT_JOB_PHASES = {
+    ImportJobPhase.DONE,
+    ImportJobPhase.CURRENT,
+    ImportJobPhase.FAILED,
+}
+
+
+@dataclass(kw_only=True)
+class ImportJob:
+    uuid: UUID
+    zoning_id: str
+    valid_date: datetime.date
+    phase: ImportJobPhase
+    row_counts: Optional[dict[str, int]] = None
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    index_seconds: Optional[float] = None
+
+
+def insert_import_job(
+    *,
+    uuid: UUID,
+    zoning_id: str,
+    valid_date: datetime.date,
+    file_url: str,
+    archived_file_path: str | None,
+):
+    run_statement(
+        sql.SQL("""
+INSERT INTO {table} (uuid, zoning_id, valid_date, file_url, archived_file_path, phase)
+VALUES (%s, %s, %s, %s, %s, %s)
+""").format(
+            table=sql.Identifier(IMPORT_JOB_TABLE_NAME),
+        ),
+        (
+            uuid,
+            zoning_id,
+            valid_date,
+            file_url,
+            archived_file_path,
+            ImportJobPhase.QUEUED.value,
+        ),
+    )
+
+
+def set_import_job_phase(
+    uuid: UUID,
+    phase: ImportJobPhase,
+    *,
+    row_counts: dict[str, int] | None = None,
+    index_seconds: float | None = None,
+    error: str | None = None,
+):
+    is_final = phase in FINAL_IMPORT_JOB_PHASES
+    run_statement(
+        sql.SQL("""
+UPDATE {table}
+SET phase = %s,
+    row_counts = coalesce(%s, row_counts),
+    index_seconds = coalesce(%s, index_seconds),
+    error = %s,
+    started_at = coalesce(started_at, now()),
+    finished_at = case when %s then now() else null end
+WHERE uuid = %s
+""").format(
+            table=sql.Identifier(IMPORT_JOB_TABLE_NAME),
+        ),
+        (
+            phase.value,
+            Jsonb(row_counts) if row_counts is not None else None,
+            index_seconds,
+            error,
+            is_final,
+            uuid,
+        ),
+    )
+
+
+def fail_unfinished_import_jobs(*, error: str):
+    run_statement(
+        sql.SQL("""
+UPDATE {table}
+SET phase = %s, error = %s, finished_at = now()
+WHERE finished_at IS NULL
+""").format(
+            table=sql.Identifier(IMPORT_JOB_TABLE_NAME),
+        ),
+        (ImportJobPhase.FAILED.value, error),
+    )
+
+
+IMPORT_JOB_QUERY = sql.SQL("""
+SELECT uuid, zoning_id, valid_date, phase, row_counts, error, created_at, started_at, finished_at,
+       index_seconds
+from {table}
+where uuid = %s
+""").format(
+    table=sql.Identifier(IMPORT_JOB_TABLE_NAME),
+)
+
+
+def get_import_job(uuid: UUID) -> ImportJob | None:
+    return rows_to_import_job(run_query(IMPORT_JOB_QUERY, (uuid,)))
+
+
+def rows_to_import_job(rows: list) -> ImportJob | None:
+    if not rows:
+        return None
+    (
+        job_uuid,
+        zoning_id,
+        valid_date,
+        phase,
+        row_counts,
+        error,
+        created_at,
+        started_at,
+        finished_at,
+        index_seconds,
+    ) = rows[0]
+    return ImportJob(
+        uuid=job_uuid,
+        zoning_id=zoning_id,
+        valid_date=valid_date,
+        phase=ImportJobPhase(phase),
+        row_counts=row_counts,
+        error=error,
+        created_at=created_at,
+        started_at=started_at,
+        finished_at=finished_at,
+        index_seconds=index_seconds,
     )
 
 
@@ -179,15 +610,40 @@ class TitleDeedOwnerOverview:
     owner_types: list[OwnerType]  # distinct owner types
 
 
-def get_zoning_title_deeds_ownership(
-    zoning_code: int, title_deed_numbers: list[int]
-) -> list[TitleDeedOwnerOverview]:
-    schema_name = _get_vfk_schema_name(zoning_id=zoning_code)
-    if not schema_name:
-        raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
-    rows = run_query(
-        sql.SQL("""
-select tel.id tel_id,
+def _get_owner_types(vlastnici: list[dict] | None) -> list[OwnerType]:
+    return [
+        OwnerType(
+            type_code=vl["charos_kod"],
+            type_group=vl["opsub_type"],
+            owner_ico=vl.get("ico"),
+        )
+        for vl in vlastnici or []
+    ]
+
+
+def get_title_deeds_ownership_query(
+    title_deeds: dict[int, list[int]], schema_names: dict[int, str]
+) -> tuple[sql.Composed, list]:
+    """
+    One query over schemas of all zonings, so that the number of round trips does
+    not grow with the number of zonings. Rows are ordered by zoning in the order
+    of title_deeds, then by title deed ID.
+
+    Values are passed as parameters of stable types, so that the query text
+    depends only on involved schemas and can be prepared.
+    """
+    zoning_queries: list[sql.Composed] = []
+    params: list = []
+    for zoning_order, (zoning_code, title_deed_numbers) in enumerate(
+        title_deeds.items()
+    ):
+        schema_name = schema_names.get(zoning_code)
+        if not schema_name:
+            raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
+        zoning_queries.append(
+            sql.SQL("""
+select {zoning_order} zoning_order,
+      tel.id tel_id,
       tel.katuze_kod,
       tel.cislo_tel,
       (
@@ -205,37 +661,268 @@ select tel.id tel_id,
           where (vla2.tel_id = tel.id and vla2.opsub_id = opsub1.id)
        ) as vlastnici
 from {tel_table} tel
-where tel.cislo_tel = ANY({title_deed_numbers}) and tel.katuze_kod = {zoning_code}
-order by tel.id
-    """).format(
-            tel_table=sql.Identifier(schema_name, "tel"),
-            vla_table=sql.Identifier(schema_name, "vla"),
-            opsub_table=sql.Identifier(schema_name, "opsub"),
-            title_deed_numbers=sql.Literal(title_deed_numbers),
-            zoning_code=sql.Literal(zoning_code),
+where tel.cislo_tel = ANY(%s) and tel.katuze_kod = %s
+""").format(
+                zoning_order=sql.Literal(zoning_order),
+                tel_table=sql.Identifier(schema_name, "tel"),
+                vla_table=sql.Identifier(schema_name, "vla"),
+                opsub_table=sql.Identifier(schema_name, "opsub"),
+            )
         )
+        params += [[Int8(n) for n in title_deed_numbers], Int8(zoning_code)]
+    query = sql.SQL("""
+select tel_id, katuze_kod, cislo_tel, pocet_vlastniku, vlastnici
+from ({zoning_queries}) ownership
+order by zoning_order, tel_id
+    """).format(zoning_queries=sql.SQL("union all").join(zoning_queries))
+    return query, params
+
+
+def row_to_title_deed_owner_overview(row: tuple) -> TitleDeedOwnerOverview:
+    tel_id, katuze_kod, cislo_tel, pocet_vlastniku, vlastnici = row
+    return TitleDeedOwnerOverview(
+        zoning_code=katuze_kod,
+        title_deed_id=tel_id,
+        title_deed_number=cislo_tel,
+        owners_count=pocet_vlastniku,
+        owner_types=_get_owner_types(vlastnici),
     )
-    result: list[TitleDeedOwnerOverview] = []
-    for row in rows:
-        tel_id, katuze_kod, cislo_tel, pocet_vlastniku, vlastnici = row
-        vlastnici = vlastnici or []
-        result.append(
-            TitleDeedOwnerOverview(
-                zoning_code=katuze_kod,
-                title_deed_id=tel_id,
-                title_deed_number=cislo_tel,
-                owners_count=pocet_vlastniku,
-                owner_types=[
-                    OwnerType(
-                        type_code=vl["charos_kod"],
-                        type_group=vl["opsub_type"],
-                        owner_ico=vl.get("ico"),
-                    )
-                    for vl in vlastnici
-                ],
+
+
+def get_title_deeds_ownership(
+    title_deeds: dict[int, list[int]],
+) -> list[TitleDeedOwnerOverview]:
+    if not title_deeds:
+        return []
+    query, params = get_title_deeds_ownership_query(
+        title_deeds, _get_cached_vfk_schema_names()
+    )
+    rows = run_prepared_query(query, params)
+    return [row_to_title_deed_owner_overview(row) for row in rows]
+
+
+def iter_title_deeds_ownership(
+    title_deeds: dict[int, list[int]],
+) -> Iterator[TitleDeedOwnerOverview]:
+    """
+    Like get_title_deeds_ownership, but rows are streamed from server-side
+    cursor. Zoning schemas are resolved immediately.
+    """
+    if not title_deeds:
+        return iter([])
+    query, params = get_title_deeds_ownership_query(
+        title_deeds, _get_cached_vfk_schema_names()
+    )
+    rows = db.iter_query(query, params, db_uri=settings.database_url)
+    return (row_to_title_deed_owner_overview(row) for row in rows)
+
+
+@dataclass(kw_only=True)
+class ParcelOwnerOverview:
+    parcel_id: int  # par.id
+    zoning_code: int  # par.katuze_kod
+    title_deed_id: Optional[int] = None  # tel.id
+    title_deed_number: Optional[int] = None  # tel.cislo_tel
+    owners_count: int  # number of unique owners (eligible legal persons)
+    owner_types: list[OwnerType]  # distinct owner types
+
+
+def get_parcels_ownership_query(
+    parcel_ids: dict[int, list[int]], schema_names: dict[int, str]
+) -> tuple[sql.Composed, list]:
+    """
+    Parcel ids are grouped by zoning code. One query over schemas of all zonings,
+    rows are ordered by zoning in the order of parcel_ids, then by parcel ID.
+    """
+    zoning_queries: list[sql.Composed] = []
+    params: list = []
+    for zoning_order, (zoning_code, zoning_parcel_ids) in enumerate(parcel_ids.items()):
+        schema_name = schema_names.get(zoning_code)
+        if not schema_name:
+            raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
+        zoning_queries.append(
+            sql.SQL("""
+select {zoning_order} zoning_order,
+      par.id par_id,
+      par.katuze_kod,
+      tel.id tel_id,
+      tel.cislo_tel,
+      (
+          select count(distinct vla1.opsub_id)
+          from {vla_table} vla1
+          where vla1.tel_id = tel.id
+      ) pocet_vlastniku,
+      (
+          select jsonb_agg(distinct jsonb_strip_nulls(jsonb_build_object(
+                      'opsub_type', opsub1.opsub_type,
+                      'charos_kod', opsub1.charos_kod,
+                      'ico', opsub1.ico
+                  )))
+          from {vla_table} vla2, {opsub_table} opsub1
+          where (vla2.tel_id = tel.id and vla2.opsub_id = opsub1.id)
+       ) as vlastnici
+from {par_table} par
+         left outer join {tel_table} tel on (tel.id = par.tel_id)
+where par.id = ANY(%s)
+""").format(
+                zoning_order=sql.Literal(zoning_order),
+                par_table=sql.Identifier(schema_name, "par"),
+                tel_table=sql.Identifier(schema_name, "tel"),
+                vla_table=sql.Identifier(schema_name, "vla"),
+                opsub_table=sql.Identifier(schema_name, "opsub"),
             )
         )
-    return result
+        params.append([Int8(par_id) for par_id in zoning_parcel_ids])
+    query = sql.SQL("""
+select par_id, katuze_kod, tel_id, cislo_tel, pocet_vlastniku, vlastnici
+from ({zoning_queries}) ownership
+order by zoning_order, par_id
+    """).format(zoning_queries=sql.SQL("union all").join(zoning_queries))
+    return query, params
+
+
+def row_to_parcel_owner_overview(row: tuple) -> ParcelOwnerOverview:
+    par_id, katuze_kod, tel_id, cislo_tel, pocet_vlastniku, vlastnici = row
+    return ParcelOwnerOverview(
+        parcel_id=par_id,
+        zoning_code=katuze_kod,
+        title_deed_id=tel_id,
+        title_deed_number=cislo_tel,
+        owners_count=pocet_vlastniku,
+        owner_types=_get_owner_types(vlastnici),
+    )
+
+
+def get_parcels_ownership(
+    parcel_ids: dict[int, list[int]],
+) -> list[ParcelOwnerOverview]:
+    if not parcel_ids:
+        return []
+    query, params = get_parcels_ownership_query(
+        parcel_ids, _get_cached_vfk_schema_names()
+    )
+    rows = run_prepared_query(query, params)
+    return [row_to_parcel_owner_overview(row) for row in rows]
+
+
+@dataclass(kw_only=True)
+class ParcelIntersection:
+    parcel_id: int  # par.id
+    zoning_code: int  # par.katuze_kod
+    title_deed_id: Optional[int] = None  # tel.id
+    title_deed_number: Optional[int] = None  # tel.cislo_tel
+    parcel_area_m2: Optional[int] = None  # par.vymera_parcely, official area
+    intersection_area_m2: float  # area of parcel geometry covered by features
+
+
+def get_parcels_intersection_query(schema_names: list[str]) -> sql.Composed:
+    """
+    Parcels of all given schemas intersecting any polygon of GeoJSON feature
+    collection in EPSG:5514, passed as the only parameter. Features are matched
+    against GiST index of parcel geometries, parcels only touching features are
+    omitted.
+    """
+    schema_queries = [
+        sql.SQL("""
+select par.id par_id,
+       par.katuze_kod,
+       tel.id tel_id,
+       tel.cislo_tel,
+       par.vymera_parcely,
+       ST_Area(ST_Intersection(par.{geom}, covering.geom)) plocha_pruniku
+from (
+    select par1.ogc_fid, ST_Union(feature.geom) geom
+    from feature
+             inner join {par_table} par1 on ST_Intersects(par1.{geom}, feature.geom)
+    group by par1.ogc_fid
+) covering
+         inner join {par_table} par on (par.ogc_fid = covering.ogc_fid)
+         left outer join {tel_table} tel on (tel.id = par.tel_id)
+""").format(
+            geom=sql.Identifier(db_load.GEOMETRY_COLUMN),
+            par_table=sql.Identifier(schema_name, "par"),
+            tel_table=sql.Identifier(schema_name, "tel"),
+        )
+        for schema_name in schema_names
+    ]
+    return sql.SQL("""
+with feature as (
+    select ST_MakeValid(ST_SetSRID(ST_GeomFromGeoJSON(f -> 'geometry'), {srid})) geom
+    from jsonb_array_elements(%s::jsonb -> 'features') f
+    where jsonb_typeof(f -> 'geometry') = 'object'
+)
+select par_id, katuze_kod, tel_id, cislo_tel, vymera_parcely, plocha_pruniku
+from ({schema_queries}) intersection
+where plocha_pruniku > 0
+order by katuze_kod, par_id
+    """).format(
+        srid=sql.Literal(db_load.SRID),
+        schema_queries=sql.SQL("union all").join(schema_queries),
+    )
+
+
+def row_to_parcel_intersection(row: tuple) -> ParcelIntersection:
+    par_id, katuze_kod, tel_id, cislo_tel, vymera_parcely, plocha_pruniku = row
+    return ParcelIntersection(
+        parcel_id=par_id,
+        zoning_code=katuze_kod,
+        title_deed_id=tel_id,
+        title_deed_number=cislo_tel,
+        parcel_area_m2=vymera_parcely,
+        intersection_area_m2=plocha_pruniku,
+    )
+
+
+def get_parcels_intersection(geojson: str) -> list[ParcelIntersection]:
+    schema_names = sorted(_get_cached_vfk_schema_names().values())
+    if not schema_names:
+        return []
+    rows = run_query(get_parcels_intersection_query(schema_names), (geojson,))
+    return [row_to_parcel_intersection(row) for row in rows]
+
+
+def get_parcel_tile_query(schema_names: list[str]) -> sql.Composed:
+    """
+    Mapbox vector tile with parcels of all given schemas. Parameters: zoom, x, y
+    of tile in tile grid of tiles module.
+    """
+    schema_queries = [
+        sql.SQL("""
+select ST_AsMVTGeom(par.{geom}, bounds.geom::box2d, {extent}, {buffer}) geom,
+       par.id,
+       par.katuze_kod zoning_code,
+       par.kmenove_cislo_par root_number,
+       par.poddeleni_cisla_par subdivision_number,
+       tel.cislo_tel title_deed_number
+from bounds, {par_table} par
+         left outer join {tel_table} tel on (tel.id = par.tel_id)
+where par.{geom} && bounds.geom
+""").format(
+            geom=sql.Identifier(db_load.GEOMETRY_COLUMN),
+            extent=sql.Literal(tiles.TILE_EXTENT),
+            buffer=sql.Literal(tiles.TILE_BUFFER),
+            par_table=sql.Identifier(schema_name, "par"),
+            tel_table=sql.Identifier(schema_name, "tel"),
+        )
+        for schema_name in schema_names
+    ]
+    min_x, min_y, max_x, max_y = tiles.TILE_GRID_EXTENT
+    return sql.SQL("""
+with bounds as (
+    select ST_TileEnvelope(%s, %s, %s, ST_MakeEnvelope({min_x}, {min_y}, {max_x}, {max_y}, {srid})) geom
+)
+select ST_AsMVT(tile, {layer_name}, {extent}, 'geom')
+from ({schema_queries}) tile
+    """).format(
+        min_x=sql.Literal(min_x),
+        min_y=sql.Literal(min_y),
+        max_x=sql.Literal(max_x),
+        max_y=sql.Literal(max_y),
+        srid=sql.Literal(db_load.SRID),
+        layer_name=sql.Literal(tiles.TILE_LAYER_NAME),
+        extent=sql.Literal(tiles.TILE_EXTENT),
+        schema_queries=sql.SQL("union all").join(schema_queries),
+    )
 
 
 @dataclass(kw_only=True)
@@ -279,15 +966,9 @@ class TitleDeed:
     ownership: list[Ownership]
 
 
-def get_zoning_title_deed(
-    zoning_code: int, title_deed_number: int
-) -> tuple[TitleDeed | None, datetime.date]:
-    schema_name = _get_vfk_schema_name(zoning_id=zoning_code)
-    if not schema_name:
-        raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
-
-    rows = run_query(
-        sql.SQL("""
+def get_zoning_title_deed_query(schema_name: str) -> sql.Composed:
+    # parameters: zoning code, title deed number
+    return sql.SQL("""
 select tel.id tel_id,
        tel.cislo_tel,
        tel.katuze_kod,
@@ -329,21 +1010,22 @@ select tel.id tel_id,
 
 from {tel_table} tel
          inner join {katuze_table} katuze on (tel.katuze_kod = katuze.kod)
-where tel.katuze_kod = {zoning_code} and tel.cislo_tel = {title_deed_number}
+where tel.katuze_kod = %s and tel.cislo_tel = %s
     """).format(
-            tel_table=sql.Identifier(schema_name, "tel"),
-            katuze_table=sql.Identifier(schema_name, "katuze"),
-            par_table=sql.Identifier(schema_name, "par"),
-            vla_table=sql.Identifier(schema_name, "vla"),
-            opsub_table=sql.Identifier(schema_name, "opsub"),
-            typrav_table=sql.Identifier(schema_name, "typrav"),
-            charos_table=sql.Identifier(schema_name, "charos"),
-            zdpaze_table=sql.Identifier(schema_name, "zdpaze"),
-            zoning_code=sql.Literal(zoning_code),
-            title_deed_number=sql.Literal(title_deed_number),
-        )
+        tel_table=sql.Identifier(schema_name, "tel"),
+        katuze_table=sql.Identifier(schema_name, "katuze"),
+        par_table=sql.Identifier(schema_name, "par"),
+        vla_table=sql.Identifier(schema_name, "vla"),
+        opsub_table=sql.Identifier(schema_name, "opsub"),
+        typrav_table=sql.Identifier(schema_name, "typrav"),
+        charos_table=sql.Identifier(schema_name, "charos"),
+        zdpaze_table=sql.Identifier(schema_name, "zdpaze"),
     )
 
+
+def rows_to_zoning_title_deed(
+    rows: list, schema_name: str
+) -> tuple[TitleDeed | None, datetime.date]:
     title_deeds: list[TitleDeed] = []
     for row in rows:
         tel_id, cislo_tel, katuze_kod, katuze_nazev, parcely, vlastnictvi = row
@@ -387,3 +1069,16 @@ where tel.katuze_kod = {zoning_code} and tel.cislo_tel = {title_deed_number}
         raise ValueError(ValueErrors.MORE_TITLE_DEEDS_FOUND)
     _, valid_date = _schema_to_id_and_date(schema_name)
     return (title_deeds[0] if len(title_deeds) > 0 else None), valid_date
+
+
+def get_zoning_title_deed(
+    zoning_code: int, title_deed_number: int
+) -> tuple[TitleDeed | None, datetime.date]:
+    schema_name = _get_vfk_schema_name(zoning_id=zoning_code)
+    if not schema_name:
+        raise ValueError(ValueErrors.ZONING_SCHEMA_NOT_FOUND)
+    rows = run_prepared_query(
+        get_zoning_title_deed_query(schema_name),
+        (Int8(zoning_code), Int8(title_deed_number)),
+    )
+    return rows_to_zoning_title_deed(rows, schema_name)
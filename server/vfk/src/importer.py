@@ -0,0 +1,230 @@
+import datetime
+import hashlib
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from uuid import UUID
+
+import requests
+from pydantic import HttpUrl
+
+import cache
+import tiles
+from common.files import static_url_to_file_path
+from common.settings import settings
+from db import load as db_load
+from db import util as db_util
+from db.util import ImportJobPhase
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.vfk_import_workers, thread_name_prefix="vfk-import"
+)
+
+
+def _load_with_ogr2ogr(
+    *, db_schema: str, file_url: str, archived_file_path: str | None
+):
+    req_url = urljoin(
+        str(settings.internal_ogr2ogr_url), "/api/ogr2ogr/v1/vfk-to-postgis"
+    )
+    resp = requests.post(
+        req_url,
+        json={
+            "file_url": {
+                "url": file_url,
+                "archived_file_path": archived_file_path,
+            },
+            "db_schema": db_schema,
+        },
+    )
+    resp.raise_for_status()
+
+
+def _run_change_import_job(
+    job_uuid: UUID,
+    *,
+    zoning_id: str,
+    valid_from: datetime.date,
+    valid_date: datetime.date,
+    file_url: str,
+    archived_file_path: str | None,
+):
+    # change files are small, they are always loaded by native loader
+    db_util.set_import_job_phase(job_uuid, ImportJobPhase.LOADING)
+    db_util.ensure_empty_tmp_vfk_schema(zoning_id, valid_date)
+    row_counts = db_load.load_vfk_file(
+        db_util.get_schema_name(zoning_id, valid_date, tmp=True),
+        static_url_to_file_path(HttpUrl(file_url)),
+        archived_file_path,
+        with_geometries=False,
+    )
+
+    db_util.set_import_job_phase(
+        job_uuid, ImportJobPhase.APPLYING, row_counts=row_counts
+    )
+    db_util.apply_tmp_vfk_changes(zoning_id, valid_from, valid_date)
+    cache.invalidate_zoning(int(zoning_id))
+    tiles.invalidate_cached_tiles()
+
+    db_util.set_import_job_phase(job_uuid, ImportJobPhase.DONE)
+
+
+def _run_import_job(
+    job_uuid: UUID,
+    *,
+    zoning_id: str,
+    valid_from: datetime.date | None,
+    valid_date: datetime.date,
+    file_url: str,
+    archived_file_path: str | None,
+    file_identity: str | None,
+):
+    start = time.perf_counter()
+    try:
+        if valid_from is not None:
+            _run_change_import_job(
+                job_uuid,
+                zoning_id=zoning_id,
+                valid_from=valid_from,
+                valid_date=valid_date,
+                file_url=file_url,
+                archived_file_path=archived_file_path,
+            )
+            return
+
+        file_path = static_url_to_file_path(HttpUrl(file_url))
+        db_util.set_import_job_phase(job_uuid, ImportJobPhase.LOADING)
+        db_util.ensure_empty_tmp_vfk_schema(zoning_id, valid_date)
+        db_schema = db_util.get_schema_name(zoning_id, valid_date, tmp=True)
+        content_hash = None
+        if settings.vfk_import_loader == "native":
+            # content is hashed while it is loaded, without another reading
+            file_hash = hashlib.sha256()
+            row_counts = db_load.load_vfk_file(
+                db_schema,
+                file_path,
+                archived_file_path,
+                on_read=file_hash.update,
+            )
+            content_hash = file_hash.hexdigest()
+            if content_hash == db_util.get_import_content_hash(zoning_id, valid_date):
+                logger.info(
+                    f"Zoning {zoning_id} is already imported from the same file"
+                )
+                db_util.drop_tmp_vfk_schema(zoning_id, valid_date)
+                if file_identity is not None:
+                    db_util.set_import_file_identity(zoning_id, file_identity)
+                db_util.set_import_job_phase(
+                    job_uuid, ImportJobPhase.CURRENT, row_counts=row_counts
+                )
+                return
+        else:
+            _load_with_ogr2ogr(
+                db_schema=db_schema,
+                file_url=file_url,
+                archived_file_path=archived_file_path,
+            )
+            row_counts = db_util.get_schema_row_counts(db_schema)
+
+        db_util.set_import_job_phase(
+            job_uuid, ImportJobPhase.INDEXING, row_counts=row_counts
+        )
+        index_seconds = db_util.build_vfk_schema_indexes(db_schema)
+
+        db_util.set_import_job_phase(
+            job_uuid, ImportJobPhase.SWAPPING, index_seconds=index_seconds
+        )
+        db_util.set_tmp_vfk_schema_as_main(
+            zoning_id,
+            valid_date,
+            row_counts=row_counts,
+            import_seconds=time.perf_counter() - start,
+            content_hash=content_hash,
+            file_identity=file_identity,
+        )
+        cache.invalidate_zoning(int(zoning_id))
+        tiles.invalidate_cached_tiles()
+
+        db_util.set_import_job_phase(job_uuid, ImportJobPhase.DONE)
+    except Exception as e:
+        logger.error(f"Import job {job_uuid} failed", exc_info=True)
+        db_util.set_import_job_phase(job_uuid, ImportJobPhase.FAILED, error=str(e))
+
+
+def submit_import_job(
+    *,
+    zoning_id: str,
+    valid_date: datetime.date,
+    file_url: str,
+    archived_file_path: str | None,
+    valid_from: datetime.date | None = None,
+    file_identity: str | None = None,
+) -> UUID:
+    """
+    Register import job in DB and run it in the background. If valid_from is
+    given, the file is VFK change file with changes from valid_from to
+    valid_date, applied to already imported zoning. Otherwise the job ends in
+    phase CURRENT after loading if the zoning is already imported from file
+    with the same content hash. The file_identity is recorded with the import.
+
+    Raises psycopg.errors.UniqueViolation if another import of the same zoning
+    is not finished yet.
+    """
+    job_uuid = uuid.uuid4()
+    db_util.insert_import_job(
+        uuid=job_uuid,
+        zoning_id=zoning_id,
+        valid_date=valid_date,
+        file_url=file_url,
+        archived_file_path=archived_file_path,
+    )
+    executor.submit(
+        _run_import_job,
+        job_uuid,
+        zoning_id=zoning_id,
+        valid_from=valid_from,
+        valid_date=valid_date,
+        file_url=file_url,
+        archived_file_path=archived_file_path,
+        file_identity=file_identity,
+    )
+    return job_uuid
+
+
+def record_current_import_job(
+    *,
+    zoning_id: str,
+    valid_date: datetime.date,
+    file_url: str,
+    archived_file_path: str | None,
+) -> UUID:
+    """
+    Register finished import job of file that is already imported.
+
+    Raises psycopg.errors.UniqueViolation if another import of the same zoning
+    is not finished yet.
+    """
+    job_uuid = uuid.uuid4()
+    db_util.insert_import_job(
+        uuid=job_uuid,
+        zoning_id=zoning_id,
+        valid_date=valid_date,
+        file_url=file_url,
+        archived_file_path=archived_file_path,
+    )
+    db_util.set_import_job_phase(job_uuid, ImportJobPhase.CURRENT)
+    return job_uuid
+
+
+def fail_interrupted_import_jobs():
+    # jobs are run only in-process, so any unfinished job was interrupted
+    db_util.fail_unfinished_import_jobs(error="Import interrupted by restart")
+
+
+def shutdown():
+    executor.shutdown(wait=False, cancel_futures=True)
+    db_load.shutdown()
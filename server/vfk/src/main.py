@@ -1,23 +1,51 @@
+import asyncio
+import functools
+import itertools
+import json
 import logging
+import os
 import re
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dataclasses import asdict
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 from enum import StrEnum
-from typing import Annotated, Optional
-from urllib.parse import urljoin
+from typing import Annotated, AsyncIterable, AsyncIterator, Optional
+from uuid import UUID
 
-import requests
-from fastapi import Body, FastAPI, HTTPException, Path
+from fastapi import Body, FastAPI, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
+from psycopg.errors import UniqueViolation
 from pydantic import BaseModel, Field, HttpUrl
 
+import cache
+import importer
+import tiles
+import vfkfile
+from common import async_db
 from common.files import static_url_to_file_path
 from common.settings import settings
+from db import async_util as db_async_util
 from db import util as db_util
+from db.util import ImportJobPhase
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(root_path="/api/vfk")
+metadata_executor = ThreadPoolExecutor(
+    max_workers=settings.vfk_metadata_workers, thread_name_prefix="vfk-metadata"
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    importer.fail_interrupted_import_jobs()
+    yield
+    importer.shutdown()
+    metadata_executor.shutdown(wait=False, cancel_futures=True)
+    await async_db.close_connection_pools()
+
+
+app = FastAPI(root_path="/api/vfk", lifespan=lifespan)
 
 
 @app.get("/api/vfk/v1/hello")
@@ -43,18 +71,29 @@ class CadastralImport(BaseModel):
     },
 )
 async def list_db_imports():
-    db_imports = db_util.get_vfk_imports()
+    db_imports = await db_async_util.get_vfk_imports()
     result = [CadastralImport(**asdict(ci)) for ci in db_imports]
     return result
 
 
-def _get_valid_date(head_lines: list[str]) -> date:
+def _get_valid_dates(head_lines: list[str]) -> tuple[date, date]:
     valid_line = next(ln for ln in head_lines if ln.startswith("&HPLATNOST;"))
-    valid_match = re.match(r"^[^;]+;\"(?P<from>[^;]+)\".*$", valid_line)
+    valid_match = re.match(r"^[^;]+;\"(?P<from>[^;]+)\";\"(?P<to>[^;]+)\"$", valid_line)
     assert valid_match
-    datetime_str = valid_match.group("from")
-    dt = datetime.strptime(datetime_str, "%d.%m.%Y %H:%M:%S")
-    return dt.date()
+    valid_from, valid_to = (
+        datetime.strptime(valid_match.group(group), "%d.%m.%Y %H:%M:%S").date()
+        for group in ("from", "to")
+    )
+    return valid_from, valid_to
+
+
+def _get_valid_date(head_lines: list[str]) -> date:
+    # the same as valid from for files without changes
+    return _get_valid_dates(head_lines)[1]
+
+
+def _is_change_file(head_lines: list[str]) -> bool:
+    return "&HZMENY;1" in head_lines
 
 
 def _get_zoning_id(head_lines: list[str]) -> str:
@@ -99,16 +138,14 @@ def _check_vfk_file_head(head_lines: list[str]) -> list[str]:
         else:
             from_str = valid_match.group("from")
             to_str = valid_match.group("to")
-            if from_str != to_str:
+            if from_str != to_str and not _is_change_file(head_lines):
                 problems.append("Data platnosti souboru se neshodují")
 
     changes_line = next((ln for ln in head_lines if ln.startswith("&HZMENY;")), None)
     if changes_line is None:
         problems.append("Nenalezen řádek s indikací změn souboru VFK")
-    if changes_line != "&HZMENY;0":
-        problems.append(
-            "Soubor VFK obsahuje změny, nikoliv platná data k určitému okamžiku"
-        )
+    elif changes_line not in {"&HZMENY;0", "&HZMENY;1"}:
+        problems.append("Neznámá indikace změn souboru VFK")
 
     return problems
 
@@ -122,21 +159,34 @@ class VfkMetadata(BaseModel):
     file: FileUrl
     problems: list[str]
     valid_date: Optional[date] = None
+    valid_from: Optional[date] = Field(
+        description="start of changes, only for VFK change files", default=None
+    )
     zoning_id: Optional[str] = None
 
 
-def _get_file_head(file: FileUrl) -> list[str]:
+@functools.lru_cache(maxsize=1024)
+def _read_file_head(
+    file_path: str, archived_file_path: str | None, mtime_ns: int
+) -> tuple[str, ...]:
+    # mtime_ns is part of the cache key only, so changed file is read again
     lines_to_read = 12
+    with vfkfile.open_vfk_file(file_path, archived_file_path) as vfk_file:
+        head = list(itertools.islice(vfkfile.iter_lines(vfk_file), lines_to_read))
+    return tuple(ln.strip() for ln in head)
+
+
+def _get_file_head(file: FileUrl) -> list[str]:
     file_path = static_url_to_file_path(file.url)
-    if file.archived_file_path is None:
-        with open(file_path, "rb") as input_file:
-            head = [next(input_file) for _ in range(lines_to_read)]
-    else:
-        with zipfile.ZipFile(file_path, "r") as zip_file:
-            with zip_file.open(file.archived_file_path) as vfk_file:
-                head = [next(vfk_file) for _ in range(lines_to_read)]
-    head = [ln.decode("utf-8").strip() for ln in head]
-    return head
+    mtime_ns = os.stat(file_path).st_mtime_ns
+    return list(_read_file_head(file_path, file.archived_file_path, mtime_ns))
+
+
+async def _get_file_heads(files: list[FileUrl]) -> list[list[str]]:
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(loop.run_in_executor(metadata_executor, _get_file_head, f) for f in files)
+    )
 
 
 @app.post(
@@ -152,48 +202,170 @@ def _get_file_head(file: FileUrl) -> list[str]:
 )
 async def get_files_metadata(files: list[FileUrl]):
     result: list[VfkMetadata] = []
-    for file in files:
-        head = _get_file_head(file)
+    for file, head in zip(files, await _get_file_heads(files)):
         problems = _check_vfk_file_head(head)
         md = VfkMetadata(file=file, problems=problems)
         if not problems:
             md.valid_date = _get_valid_date(head)
+            if _is_change_file(head):
+                md.valid_from = _get_valid_dates(head)[0]
             md.zoning_id = _get_zoning_id(head)
         result.append(md)
     return result
 
 
+class ImportJob(BaseModel):
+    id: UUID
+    zoning_id: str
+    valid_date: date
+    phase: ImportJobPhase
+    row_counts: Optional[dict[str, int]] = Field(
+        description="number of rows by table, known after loading", default=None
+    )
+    index_seconds: Optional[float] = Field(
+        description="duration of building indexes and statistics", default=None
+    )
+    error: Optional[str] = None
+    elapsed_seconds: float
+
+
+def _import_job_to_response(job: db_util.ImportJob) -> ImportJob:
+    end = job.finished_at or datetime.now(timezone.utc)
+    return ImportJob(
+        id=job.uuid,
+        zoning_id=job.zoning_id,
+        valid_date=job.valid_date,
+        phase=job.phase,
+        row_counts=job.row_counts,
+        index_seconds=job.index_seconds,
+        error=job.error,
+        elapsed_seconds=(end - job.created_at).total_seconds(),
+    )
+
+
 @app.post(
     "/api/vfk/v1/db/import",
     summary="Import VFK file into DB",
     operation_id="db_import",
+    status_code=202,
     responses={
-        200: {},
+        200: {
+            "model": ImportJob,
+            "description": "The same file is already imported, job is finished in phase current",
+        },
+        202: {"model": ImportJob, "description": "Import job created"},
+        400: {"description": "File is not importable VFK file"},
+        409: {"description": "Another import of the zoning is running"},
     },
 )
-async def db_import(file: FileUrl):
-    head = _get_file_head(file)
+async def db_import(file: FileUrl, response: Response):
+    (head,) = await _get_file_heads([file])
     problems = _check_vfk_file_head(head)
-    assert not problems
-    valid_date = _get_valid_date(head)
+    if problems:
+        raise HTTPException(status_code=400, detail=problems)
+    valid_from, valid_date = _get_valid_dates(head)
     zoning_id = _get_zoning_id(head)
-    db_util.ensure_empty_tmp_vfk_schema(zoning_id, valid_date)
-    req_url = urljoin(
-        str(settings.internal_ogr2ogr_url), "/api/ogr2ogr/v1/vfk-to-postgis"
-    )
-    db_schema = db_util.get_schema_name(zoning_id, valid_date, tmp=True)
-    resp = requests.post(
-        req_url,
-        json={
-            "file_url": {
-                "url": str(file.url),
-                "archived_file_path": file.archived_file_path,
-            },
-            "db_schema": db_schema,
-        },
+    is_change_file = _is_change_file(head)
+    if is_change_file:
+        db_import = next(
+            (
+                db_import
+                for db_import in await db_async_util.get_vfk_imports()
+                if db_import.zoning_id == zoning_id
+            ),
+            None,
+        )
+        if db_import is None:
+            raise HTTPException(
+                status_code=400,
+                detail=["Změny lze použít jen na již importované katastrální území"],
+            )
+        if db_import.valid_date != valid_from:
+            raise HTTPException(
+                status_code=400,
+                detail=[
+                    f"Změny platné od {valid_from} nenavazují na importovaná data "
+                    f"platná k {db_import.valid_date}"
+                ],
+            )
+    file_identity = None
+    if not is_change_file and file.archived_file_path is not None:
+        # validity, size and CRC-32 of the file, known without reading it
+        file_identity = f"{valid_from}/{valid_date};" + await asyncio.to_thread(
+            vfkfile.get_archived_file_identity,
+            static_url_to_file_path(file.url),
+            file.archived_file_path,
+        )
+    imported_identity = (
+        None
+        if file_identity is None
+        else await db_async_util.get_import_file_identity(zoning_id, valid_date)
     )
-    resp.raise_for_status()
-    db_util.set_tmp_vfk_schema_as_main(zoning_id, valid_date)
+    try:
+        if file_identity is not None and file_identity == imported_identity:
+            job_uuid = await asyncio.to_thread(
+                importer.record_current_import_job,
+                zoning_id=zoning_id,
+                valid_date=valid_date,
+                file_url=str(file.url),
+                archived_file_path=file.archived_file_path,
+            )
+            response.status_code = 200
+        else:
+            job_uuid = await asyncio.to_thread(
+                importer.submit_import_job,
+                zoning_id=zoning_id,
+                valid_date=valid_date,
+                file_url=str(file.url),
+                archived_file_path=file.archived_file_path,
+                valid_from=valid_from if is_change_file else None,
+                file_identity=file_identity,
+            )
+    except UniqueViolation:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Another import of zoning {zoning_id} is running.",
+        )
+    job = await db_async_util.get_import_job(job_uuid)
+    assert job is not None
+    return _import_job_to_response(job)
+
+
+@app.get(
+    "/api/vfk/v1/db/import-jobs/{job_id}",
+    summary="State of import job",
+    operation_id="get_db_import_job",
+    responses={
+        200: {"model": ImportJob, "description": "State of import job"},
+        404: {"description": "Import job not found"},
+    },
+)
+async def get_db_import_job(job_id: UUID):
+    job = await db_async_util.get_import_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found.")
+    return _import_job_to_response(job)
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int = Field(description="number of cached entries")
+    max_size: int
+    ttl_seconds: int
+    backend: str = Field(description="memory or sqlite")
+
+
+@app.get(
+    "/api/vfk/v1/cache/stats",
+    summary="Statistics of cache of title deed and ownership lookups",
+    operation_id="get_cache_stats",
+    responses={
+        200: {"model": CacheStats, "description": "Cache statistics"},
+    },
+)
+async def get_cache_stats():
+    return CacheStats(**asdict(await asyncio.to_thread(cache.get_stats)))
 
 
 class OwnerType(BaseModel):
@@ -210,6 +382,30 @@ class TitleDeedOwnerOverview(BaseModel):
     owner_types: list[OwnerType]  # distinct owner types
 
 
+def _title_deed_owner_overview_to_response(
+    db_result: db_util.TitleDeedOwnerOverview,
+) -> TitleDeedOwnerOverview:
+    return TitleDeedOwnerOverview(
+        zoning_code=db_result.zoning_code,
+        title_deed_id=db_result.title_deed_id,
+        title_deed_number=db_result.title_deed_number,
+        owners_count=db_result.owners_count,
+        owner_types=[
+            OwnerType(
+                type_code=ot.type_code,
+                type_group=ot.type_group,
+                owner_ico=ot.owner_ico,
+            )
+            for ot in db_result.owner_types
+        ],
+    )
+
+
+async def _iter_ndjson(items: AsyncIterable[BaseModel]) -> AsyncIterator[str]:
+    async for item in items:
+        yield item.model_dump_json(exclude_none=True) + "\n"
+
+
 @app.post(
     "/api/vfk/v1/db/title-deeds/ownership",
     summary="Get overview information about title deed ownership",
@@ -217,6 +413,17 @@ class TitleDeedOwnerOverview(BaseModel):
     description="List of overview information about title deed ownership",
     response_model=list[TitleDeedOwnerOverview],
     response_model_exclude_none=True,
+    responses={
+        200: {
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"$ref": "#/components/schemas/TitleDeedOwnerOverview"}
+                }
+            },
+            "description": "JSON list, or one JSON object per line if streamed",
+        },
+        400: {"description": "Zoning not found"},
+    },
 )
 async def get_zoning_title_deeds_ownership(
     title_deeds: Annotated[
@@ -225,34 +432,167 @@ async def get_zoning_title_deeds_ownership(
             examples=[{"612065": [417, 1299]}],
         ),
     ],
+    stream: Annotated[
+        bool,
+        Query(description="stream results as newline-delimited JSON"),
+    ] = False,
 ):
-    db_results = [
-        ownership
-        for zoning_code, title_deed_numbers in title_deeds.items()
-        for ownership in db_util.get_zoning_title_deeds_ownership(
-            zoning_code, title_deed_numbers
+    if stream:
+        try:
+            db_result_iter = await db_async_util.iter_title_deeds_ownership(title_deeds)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(
+            _iter_ndjson(
+                _title_deed_owner_overview_to_response(db_result)
+                async for db_result in db_result_iter
+            ),
+            media_type="application/x-ndjson",
         )
+
+    try:
+        db_results = await db_async_util.get_title_deeds_ownership(title_deeds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return [
+        _title_deed_owner_overview_to_response(db_result) for db_result in db_results
     ]
 
-    result: list[TitleDeedOwnerOverview] = []
-    for db_result in db_results:
-        result.append(
-            TitleDeedOwnerOverview(
-                zoning_code=db_result.zoning_code,
-                title_deed_id=db_result.title_deed_id,
-                title_deed_number=db_result.title_deed_number,
-                owners_count=db_result.owners_count,
-                owner_types=[
-                    OwnerType(
-                        type_code=ot.type_code,
-                        type_group=ot.type_group,
-                        owner_ico=ot.owner_ico,
-                    )
-                    for ot in db_result.owner_types
-                ],
-            )
+
+class ParcelOwnerOverview(BaseModel):
+    parcel_id: int  # par.id
+    zoning_code: int  # par.katuze_kod
+    title_deed_id: Optional[int] = None  # tel.id
+    title_deed_number: Optional[int] = None  # tel.cislo_tel
+    owners_count: int  # number of unique owners (eligible legal persons)
+    owner_types: list[OwnerType]  # distinct owner types
+
+
+@app.post(
+    "/api/vfk/v1/db/parcels/ownership",
+    summary="Get overview information about parcel ownership",
+    operation_id="get_zoning_parcels_ownership",
+    description="List of overview information about ownership of parcels, "
+    "parcels not found are omitted",
+    response_model=list[ParcelOwnerOverview],
+    response_model_exclude_none=True,
+    responses={
+        400: {"description": "Zoning not found"},
+    },
+)
+async def get_zoning_parcels_ownership(
+    parcel_ids: Annotated[
+        dict[int, list[int]],
+        Body(
+            examples=[{"612065": [1428508702]}],
+            description="parcel ids (VFK par.id) by zoning code",
+        ),
+    ],
+):
+    try:
+        db_results = await db_async_util.get_parcels_ownership(parcel_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return [
+        ParcelOwnerOverview(
+            parcel_id=db_result.parcel_id,
+            zoning_code=db_result.zoning_code,
+            title_deed_id=db_result.title_deed_id,
+            title_deed_number=db_result.title_deed_number,
+            owners_count=db_result.owners_count,
+            owner_types=[
+                OwnerType(
+                    type_code=ot.type_code,
+                    type_group=ot.type_group,
+                    owner_ico=ot.owner_ico,
+                )
+                for ot in db_result.owner_types
+            ],
         )
-    return result
+        for db_result in db_results
+    ]
+
+
+class ParcelsIntersectionRequest(BaseModel):
+    file_url: HttpUrl = Field(
+        description="GeoJSON file with polygons in EPSG:5514, e.g. output of "
+        "qgis fix-geometries"
+    )
+
+
+class ParcelIntersection(BaseModel):
+    parcel_id: int  # par.id
+    zoning_code: int  # par.katuze_kod
+    title_deed_id: Optional[int] = None  # tel.id
+    title_deed_number: Optional[int] = None  # tel.cislo_tel
+    parcel_area_m2: Optional[int] = None  # par.vymera_parcely, official area
+    intersection_area_m2: float  # area of parcel geometry covered by features
+
+
+def _read_geojson_file(file_path: str) -> str:
+    with open(file_path, encoding="utf-8") as geojson_file:
+        geojson = geojson_file.read()
+    # fail here rather than in database on content that is not JSON
+    json.loads(geojson)
+    return geojson
+
+
+@app.post(
+    "/api/vfk/v1/db/parcels/intersection",
+    summary="Get parcels intersecting GeoJSON file",
+    operation_id="get_parcels_intersection",
+    description="List of imported parcels intersecting polygons of GeoJSON file, "
+    "with area of intersection and title deed",
+    response_model=list[ParcelIntersection],
+    response_model_exclude_none=True,
+    responses={
+        400: {"description": "File not found or not a GeoJSON file"},
+    },
+)
+async def get_parcels_intersection(request: ParcelsIntersectionRequest):
+    file_path = static_url_to_file_path(request.file_url)
+    try:
+        geojson = await asyncio.to_thread(_read_geojson_file, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=400, detail="File not found")
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="File is not a GeoJSON file")
+
+    db_results = await db_async_util.get_parcels_intersection(geojson)
+    return [ParcelIntersection(**asdict(db_result)) for db_result in db_results]
+
+
+@app.get(
+    "/api/vfk/v1/tiles/{z}/{x}/{y}.mvt",
+    summary="Vector tile of imported parcels",
+    operation_id="get_parcel_tile",
+    description="Mapbox vector tile with layer of imported parcels in EPSG:5514. "
+    f"Tile grid has extent {tiles.TILE_GRID_EXTENT} at zoom level 0, tiles are "
+    f"numbered from top left corner. Tiles below zoom level "
+    f"{settings.vfk_tiles_min_zoom} are empty.",
+    response_class=Response,
+    responses={
+        200: {"content": {"application/vnd.mapbox-vector-tile": {}}},
+        404: {"description": "Tile out of tile grid"},
+    },
+)
+async def get_parcel_tile(z: int, x: int, y: int):
+    if not tiles.is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile not found.")
+    tile = b""
+    if z >= settings.vfk_tiles_min_zoom:
+        cached_tile = await asyncio.to_thread(tiles.read_cached_tile, z, x, y)
+        if cached_tile is None:
+            generation = await asyncio.to_thread(tiles.get_generation)
+            tile = await db_async_util.get_parcel_tile(z, x, y)
+            await asyncio.to_thread(
+                tiles.write_cached_tile, z, x, y, tile, generation=generation
+            )
+        else:
+            tile = cached_tile
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
 
 
 class ParcelNumberingType(StrEnum):
@@ -395,7 +735,7 @@ async def get_zoning_title_deed(
     ],
 ):
     try:
-        db_title_deed, valid_date = db_util.get_zoning_title_deed(
+        db_title_deed, valid_date = await db_async_util.get_zoning_title_deed(
             zoning_code, title_deed_number
         )
     except ValueError as e:
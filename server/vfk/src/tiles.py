@@ -0,0 +1,95 @@
+import logging
+import os
+import shutil
+import uuid
+
+from psycopg import sql
+
+from common import db
+from common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Tile grid of parcel vector tiles in EPSG:5514, tiles are numbered like XYZ
+# tiles, i.e. from top left corner. Zoom level 0 is one square tile covering
+# whole Czechia, every next level halves size of tiles.
+TILE_GRID_EXTENT = (-950_000.0, -1_250_000.0, -400_000.0, -700_000.0)
+TILE_EXTENT = 4096  # tile coordinate space of MVT
+TILE_BUFFER = 64
+TILE_LAYER_NAME = "parcels"
+MAX_ZOOM = 20
+
+TILE_CACHE_TABLE_NAME = "tile_cache"  # generation of cached tiles
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def _get_tile_path(z: int, x: int, y: int) -> str:
+    return os.path.join(settings.vfk_tiles_dir_path, str(z), str(x), f"{y}.mvt")
+
+
+def get_generation() -> int:
+    """
+    Generation of cached tiles, shared by all processes through DB and
+    incremented on invalidation.
+    """
+    rows = db.run_query(
+        sql.SQL("SELECT generation FROM {table}").format(
+            table=sql.Identifier(TILE_CACHE_TABLE_NAME)
+        ),
+        db_uri=settings.database_url,
+    )
+    return rows[0][0]
+
+
+def read_cached_tile(z: int, x: int, y: int) -> bytes | None:
+    try:
+        with open(_get_tile_path(z, x, y), "rb") as tile_file:
+            return tile_file.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_cached_tile(z: int, x: int, y: int, tile: bytes, *, generation: int):
+    """
+    Store tile rendered when cache had the given generation. Tile is dropped if
+    the cache was invalidated in the meantime.
+    """
+    tile_path = _get_tile_path(z, x, y)
+    tmp_path = f"{tile_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+        with open(tmp_path, "wb") as tile_file:
+            tile_file.write(tile)
+        pool = db.get_connection_pool(db_uri=settings.database_url)
+        with pool.connection() as conn, conn.transaction():
+            # invalidation waits until the tile is in place, so it removes it
+            row = conn.execute(
+                sql.SQL("SELECT generation FROM {table} FOR SHARE").format(
+                    table=sql.Identifier(TILE_CACHE_TABLE_NAME)
+                )
+            ).fetchone()
+            if row is not None and row[0] == generation:
+                os.replace(tmp_path, tile_path)
+                return
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        # directory was removed by concurrent invalidation
+        pass
+
+
+def invalidate_cached_tiles():
+    """
+    Remove all cached tiles. Tiles usually cover more than one zoning, so they
+    are removed all at once when any zoning is imported.
+    """
+    db.run_statement(
+        sql.SQL("UPDATE {table} SET generation = generation + 1").format(
+            table=sql.Identifier(TILE_CACHE_TABLE_NAME)
+        ),
+        db_uri=settings.database_url,
+    )
+    logger.info(f"Removing cached tiles in {settings.vfk_tiles_dir_path}")
+    shutil.rmtree(settings.vfk_tiles_dir_path, ignore_errors=True)
@@ -0,0 +1,203 @@
+import csv
+import io
+import itertools
+import re
+import zipfile
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Iterable, Iterator, LiteralString
+
+# VFK 6 exchange format, see https://www.cuzk.cz/Katastr-nemovitosti/Poskytovani-udaju-z-KN/Vymenny-format-KN/Vymenny-format-ISKN-v-textovem-tvaru
+
+LINE_CONTINUATION = "¤"  # record continues on the next line
+READ_BUFFER_SIZE = 1024 * 1024
+
+_COLUMN_TYPE_RE = re.compile(
+    r"^(?P<type>[NTD])(?P<width>\d+)?(?:\.(?P<precision>\d+))?$"
+)
+
+
+@dataclass(kw_only=True)
+class VfkColumn:
+    name: str  # lowercase
+    type: str  # N=number, T=text, D=date
+    width: int
+    precision: int
+
+    @property
+    def pg_type(self) -> LiteralString:
+        # the same mapping as GDAL VFK driver uses
+        if self.type == "N":
+            if self.precision > 0:
+                return "float8"
+            return "int4" if 0 < self.width < 10 else "int8"
+        return "text"
+
+    @property
+    def text_width(self) -> int:
+        return 25 if self.type == "D" else self.width
+
+    @property
+    def converter(self) -> Callable[[str], Any]:
+        pg_type = self.pg_type
+        if pg_type == "float8":
+            return float
+        if pg_type in {"int4", "int8"}:
+            return int
+        return str
+
+
+@dataclass(kw_only=True)
+class VfkBlock:
+    name: str  # as in file, e.g. PAR
+    columns: list[VfkColumn]
+
+    @property
+    def table_name(self) -> str:
+        return self.name.lower()
+
+
+class _ObservedReader(io.RawIOBase):
+    def __init__(self, file: IO[bytes], on_read: Callable[[memoryview], None]):
+        self._file = file
+        self._on_read = on_read
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._file.read(len(buffer))
+        buffer[: len(data)] = data
+        self._on_read(memoryview(buffer)[: len(data)])
+        return len(data)
+
+
+@contextmanager
+def open_vfk_file(
+    file_path: str,
+    archived_file_path: str | None,
+    *,
+    on_read: Callable[[memoryview], None] | None = None,
+) -> Iterator[IO[bytes]]:
+    """
+    Open VFK file, or VFK file archived in ZIP file, for reading. If on_read is
+    given, it is called with every chunk of content read from the file, e.g.
+    to hash the content in the same pass as it is loaded.
+    """
+    with ExitStack() as stack:
+        vfk_file: IO[bytes]
+        if archived_file_path is None:
+            vfk_file = stack.enter_context(open(file_path, "rb"))
+        else:
+            zip_file = stack.enter_context(zipfile.ZipFile(file_path, "r"))
+            vfk_file = stack.enter_context(zip_file.open(archived_file_path))
+        if on_read is not None:
+            vfk_file = io.BufferedReader(
+                _ObservedReader(vfk_file, on_read), READ_BUFFER_SIZE
+            )
+        yield vfk_file
+
+
+def get_archived_file_identity(file_path: str, archived_file_path: str) -> str:
+    """
+    Cheap identity of content of VFK file in ZIP archive, known without reading
+    it: size and CRC-32 from directory of the archive. There is no such identity
+    of plain file, its content must be hashed.
+    """
+    with zipfile.ZipFile(file_path, "r") as zip_file:
+        info = zip_file.getinfo(archived_file_path)
+    return f"size={info.file_size};crc32={info.CRC:08x}"
+
+
+def iter_lines(vfk_file: IO[bytes]) -> Iterator[str]:
+    """
+    Decoded lines of VFK file without line endings, continued lines are joined.
+    """
+    text_file = io.TextIOWrapper(vfk_file, encoding="utf-8-sig", newline="")
+    continued = ""
+    for line in text_file:
+        line = line.rstrip("\r\n")
+        if line.endswith(LINE_CONTINUATION):
+            continued += line[:-1]
+            continue
+        yield continued + line
+        continued = ""
+    if continued:
+        yield continued
+
+
+def _parse_block_definition(line: str) -> VfkBlock:
+    name, *column_defs = line[2:].split(";")
+    columns = []
+    for column_def in column_defs:
+        column_name, column_type = column_def.split(" ")
+        type_match = _COLUMN_TYPE_RE.match(column_type)
+        if not type_match:
+            raise ValueError(
+                f"Unknown type {column_type} of column {name}.{column_name}"
+            )
+        columns.append(
+            VfkColumn(
+                name=column_name.lower(),
+                type=type_match.group("type"),
+                width=int(type_match.group("width") or 0),
+                precision=int(type_match.group("precision") or 0),
+            )
+        )
+    return VfkBlock(name=name, columns=columns)
+
+
+def _line_key(line: str) -> tuple[str, str]:
+    kind = line[1:2]
+    if kind in {"B", "D"}:
+        return kind, line[2 : line.index(";")]
+    return kind, ""
+
+
+def parse_rows(block: VfkBlock, lines: Iterable[str]) -> Iterator[list[Any]]:
+    """
+    Values of data lines (&D) of the block, converted by column types.
+    """
+    converters = [column.converter for column in block.columns]
+    column_count = len(converters)
+    prefix_len = len(block.name) + 3  # &D<name>;
+    for values in csv.reader(
+        (line[prefix_len:] for line in lines), delimiter=";", quotechar='"'
+    ):
+        if len(values) != column_count:
+            raise ValueError(
+                f"Block {block.name} has {column_count} columns, found row with {len(values)} values"
+            )
+        yield [
+            None if value == "" else converter(value)
+            for converter, value in zip(converters, values)
+        ]
+
+
+def iter_blocks(
+    lines: Iterable[str],
+) -> Iterator[tuple[VfkBlock, Iterator[str]]]:
+    """
+    Stream blocks of VFK file together with their data lines (&D), which can be
+    parsed by parse_rows. Data lines of a block must be consumed before advancing
+    to the next block.
+
+    Blocks without any data line are yielded with no lines. Block is yielded
+    more than once if its data lines are not contiguous.
+    """
+    blocks: dict[str, VfkBlock] = {}
+    pending_block: VfkBlock | None = None  # defined block without yielded rows
+    for (kind, name), group in itertools.groupby(lines, key=_line_key):
+        if pending_block is not None and (kind, name) != ("D", pending_block.name):
+            yield pending_block, iter([])
+        pending_block = None
+        if kind == "B":
+            block = _parse_block_definition(next(group))
+            blocks[block.name] = block
+            pending_block = block
+        elif kind == "D":
+            if name not in blocks:
+                raise ValueError(f"Data of block {name} found before its definition")
+            yield blocks[name], group
+    if pending_block is not None:
+        yield pending_block, iter([])
@@ -0,0 +1,142 @@
+import uuid
+
+import pytest
+from psycopg import sql
+
+from common import db
+from common.settings import settings
+from db import load as db_load
+
+# Points are in coordinates of VFK, i.e. negative of X and Y of EPSG:5514.
+# Parcel 1 is bounded by lines 1 (points 1, 2), 2 (points 2, 3, 4) and 3
+# (points 4, 1). Point 5 is not used by any line yet.
+FULL_VFK = """&HVERZE;"6.0"
+&BSOBR;ID N30;SOURADNICE_Y N10.2;SOURADNICE_X N10.2
+&DSOBR;1;0;0
+&DSOBR;2;-10;0
+&DSOBR;3;-10;-10
+&DSOBR;4;0;-10
+&DSOBR;5;5;-5
+&BSBP;BP_ID N30;PORADOVE_CISLO_BODU N38;OB_ID N30;HP_ID N30;DATUM_ZANIKU D
+&DSBP;1;1;;1;
+&DSBP;2;2;;1;
+&DSBP;2;1;;2;
+&DSBP;3;2;;2;
+&DSBP;4;3;;2;
+&DSBP;4;1;;3;
+&DSBP;1;2;;3;
+&BHP;ID N30;PAR_ID_1 N30;PAR_ID_2 N30;DATUM_ZANIKU D
+&DHP;1;1;;
+&DHP;2;1;;
+&DHP;3;1;;
+&BPAR;ID N30;DATUM_ZANIKU D
+&DPAR;1;
+&K
+"""
+
+# Point 2 is moved, point 5 is inserted between points 4 and 1 of line 3, line
+# 1 is sent again unchanged.
+CHANGE_VFK = """&HVERZE;"6.0"
+&BSOBR;ID N30;SOURADNICE_Y N10.2;SOURADNICE_X N10.2
+&DSOBR;2;-20;0
+&BSBP;BP_ID N30;PORADOVE_CISLO_BODU N38;OB_ID N30;HP_ID N30;DATUM_ZANIKU D
+&DSBP;1;2;;3;"01.06.2025 00:00:00"
+&DSBP;5;2;;3;
+&DSBP;1;3;;3;
+&BHP;ID N30;PAR_ID_1 N30;PAR_ID_2 N30;DATUM_ZANIKU D
+&DHP;1;1;;
+&K
+"""
+
+
+@pytest.fixture
+def schema_names(monkeypatch):
+    monkeypatch.setattr(settings, "vfk_import_processes", 1)
+    suffix = uuid.uuid4().hex[:8]
+    names = (f"test_vfk_{suffix}", f"test_vfk_changes_{suffix}")
+    for name in names:
+        db.run_statement(
+            sql.SQL("CREATE SCHEMA {schema}").format(schema=sql.Identifier(name)),
+            db_uri=settings.database_url,
+        )
+    yield names
+    for name in names:
+        db.run_statement(
+            sql.SQL("DROP SCHEMA {schema} CASCADE").format(schema=sql.Identifier(name)),
+            db_uri=settings.database_url,
+        )
+
+
+def _load(tmp_path, schema_name: str, content: str, *, with_geometries: bool):
+    file_path = tmp_path / f"{schema_name}.vfk"
+    file_path.write_text(content, encoding="utf-8")
+    db_load.load_vfk_file(
+        schema_name, str(file_path), None, with_geometries=with_geometries
+    )
+
+
+def _apply_changes(schema_name: str, changes_schema_name: str) -> dict[str, int]:
+    pool = db.get_connection_pool(db_uri=settings.database_url)
+    with pool.connection() as conn, conn.transaction():
+        return db_load.apply_vfk_changes(conn, schema_name, changes_schema_name)
+
+
+def test_apply_vfk_changes_rebuilds_geometries(tmp_path, schema_names):
+    schema_name, changes_schema_name = schema_names
+    if not db.run_query(
+        "SELECT 1 FROM pg_extension WHERE extname = 'postgis'",
+        db_uri=settings.database_url,
+    ):
+        pytest.skip("PostGIS is not installed")
+    _load(tmp_path, schema_name, FULL_VFK, with_geometries=True)
+    _load(tmp_path, changes_schema_name, CHANGE_VFK, with_geometries=False)
+
+    applied = _apply_changes(schema_name, changes_schema_name)
+
+    assert applied == {"sobr": 1, "sbp": 3, "hp": 1}
+    lines = db.run_query(
+        sql.SQL("SELECT id, ST_AsText({geom}) FROM {hp} ORDER BY id").format(
+            geom=sql.Identifier(db_load.GEOMETRY_COLUMN),
+            hp=sql.Identifier(schema_name, "hp"),
+        ),
+        db_uri=settings.database_url,
+    )
+    assert lines == [
+        (1, "LINESTRING(0 0,20 0)"),
+        (2, "LINESTRING(20 0,10 10,0 10)"),
+        (3, "LINESTRING(0 10,-5 5,0 0)"),
+    ]
+    parcels = db.run_query(
+        sql.SQL("SELECT id, ST_Area({geom}) FROM {par}").format(
+            geom=sql.Identifier(db_load.GEOMETRY_COLUMN),
+            par=sql.Identifier(schema_name, "par"),
+        ),
+        db_uri=settings.database_url,
+    )
+    assert parcels == [(1, 175.0)]
+
+
+def test_apply_vfk_changes_matches_sbp_by_line_and_order(tmp_path, schema_names):
+    schema_name, changes_schema_name = schema_names
+    _load(tmp_path, schema_name, FULL_VFK, with_geometries=False)
+    _load(tmp_path, changes_schema_name, CHANGE_VFK, with_geometries=False)
+
+    _apply_changes(schema_name, changes_schema_name)
+
+    points = db.run_query(
+        sql.SQL(
+            "SELECT bp_id FROM {sbp} WHERE hp_id = 3 ORDER BY poradove_cislo_bodu"
+        ).format(sbp=sql.Identifier(schema_name, "sbp")),
+        db_uri=settings.database_url,
+    )
+    assert points == [(4,), (5,), (1,)]
+
+
+def test_apply_vfk_changes_fails_on_table_without_key(tmp_path, schema_names):
+    schema_name, changes_schema_name = schema_names
+    content = '&HVERZE;"6.0"\n&BXYZ;HODNOTA N10\n&DXYZ;1\n&K\n'
+    _load(tmp_path, schema_name, content, with_geometries=False)
+    _load(tmp_path, changes_schema_name, content, with_geometries=False)
+
+    with pytest.raises(ValueError, match="Changes of table xyz can not be matched"):
+        _apply_changes(schema_name, changes_schema_name)
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+import vfkfile
+
+
+def _lines(text: str) -> list[str]:
+    return list(vfkfile.iter_lines(io.BytesIO(text.encode("utf-8"))))
+
+
+def test_iter_lines_joins_continued_lines():
+    text = '\ufeff&HVERZE;6.0\r\n&DOPSUB;1;"Nová ¤\r\nVes¤\r\n u Prahy"\r\n&K\r\n'
+    assert _lines(text) == [
+        "&HVERZE;6.0",
+        '&DOPSUB;1;"Nová Ves u Prahy"',
+        "&K",
+    ]
+
+
+def test_iter_lines_yields_unfinished_continuation():
+    assert _lines("&DPAR;1;¤\n2") == ["&DPAR;1;2"]
+    assert _lines("&DPAR;1;¤\n") == ["&DPAR;1;"]
+
+
+def test_parse_block_definition():
+    block = vfkfile._parse_block_definition(
+        "&BPAR;ID N30;KATUZE_KOD N6;VYMERA_PARCELY N9.2;POPIS T255;DATUM_VZNIKU D"
+    )
+    assert block.name == "PAR"
+    assert block.table_name == "par"
+    assert [(c.name, c.type, c.width, c.precision) for c in block.columns] == [
+        ("id", "N", 30, 0),
+        ("katuze_kod", "N", 6, 0),
+        ("vymera_parcely", "N", 9, 2),
+        ("popis", "T", 255, 0),
+        ("datum_vzniku", "D", 0, 0),
+    ]
+    assert [c.pg_type for c in block.columns] == [
+        "int8",
+        "int4",
+        "float8",
+        "text",
+        "text",
+    ]
+
+
+def test_parse_block_definition_unknown_type():
+    with pytest.raises(ValueError, match="Unknown type X1 of column PAR.ID"):
+        vfkfile._parse_block_definition("&BPAR;ID X1")
+
+
+def test_iter_blocks_and_parse_rows():
+    lines = _lines(
+        "&HVERZE;6.0\n"
+        "&BTEL;ID N30;CISLO_TEL N10;POPIS T100\n"
+        '&DTEL;10;51;"LV ¤\n'
+        'č. 51"\n'
+        '&DTEL;11;;"a; ""b"""\n'
+        "&BOPSUB;ID N30\n"
+        "&K\n"
+    )
+    blocks = [
+        (block.name, list(vfkfile.parse_rows(block, rows)))
+        for block, rows in vfkfile.iter_blocks(lines)
+    ]
+    assert blocks == [
+        ("TEL", [[10, 51, "LV č. 51"], [11, None, 'a; "b"']]),
+        ("OPSUB", []),
+    ]
+
+
+def test_parse_rows_wrong_column_count():
+    block = vfkfile._parse_block_definition("&BTEL;ID N30;CISLO_TEL N10")
+    with pytest.raises(ValueError, match="has 2 columns"):
+        list(vfkfile.parse_rows(block, ["&DTEL;10"]))
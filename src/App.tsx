@@ -48,9 +48,7 @@ import {
 } from './olutil.ts';
 import { postFiles } from './server/files';
 import { createClient as createFilesClient } from './server/files/client';
-import { dxfToGeojson } from './server/ogr2ogr';
-import { createClient as createOgr2ogrClient } from './server/ogr2ogr/client';
-import { fixGeometries } from './server/qgis';
+import { dxfToFixedGeojson } from './server/qgis';
 import { createClient as createQgisClient } from './server/qgis/client';
 import { getZoningTitleDeedsOwnership } from './server/vfk';
 import { createClient as createVfkClient } from './server/vfk/client';
@@ -297,21 +295,11 @@ const App = () => {
         assertIsDefined(dxfResp.data);
         const dxfUrl = dxfResp.data.files[0].url;
 
-        const ogr2ogrClient = createOgr2ogrClient({
-          baseUrl: settings.publicUrl,
-        });
-        const unsafeGeojsonResp = await dxfToGeojson({
-          body: { file_url: dxfUrl },
-          client: ogr2ogrClient,
-        });
-        assertIsDefined(unsafeGeojsonResp.data);
-        const unsafeGeojsonUrl = unsafeGeojsonResp.data.file_url;
-
         const qgisClient = createQgisClient({
           baseUrl: settings.publicUrl,
         });
-        const geojsonUrlResp = await fixGeometries({
-          body: { file_url: unsafeGeojsonUrl },
+        const geojsonUrlResp = await dxfToFixedGeojson({
+          body: { file_url: dxfUrl, output_format: 'geojson-gzip' },
           client: qgisClient,
         });
         assertIsDefined(geojsonUrlResp.data);
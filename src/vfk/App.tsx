@@ -18,6 +18,7 @@ import { createClient as createFilesClient } from '../server/files/client';
 import {
   type VfkMetadata,
   dbImport,
+  getDbImportJob,
   getFilesMetadata,
   listDbImports,
 } from '../server/vfk';
@@ -55,6 +56,57 @@ const vfkClient = createFilesClient({
   baseUrl: settings.publicUrl,
 });
 
+const IMPORT_JOB_POLL_INTERVAL_MS = 2000;
+
+const waitForImportJob = async (
+  jobId: string,
+  vfkImport: VfkFileImport,
+): Promise<boolean> => {
+  while (true) {
+    await new Promise((r) => setTimeout(r, IMPORT_JOB_POLL_INTERVAL_MS));
+    const jobResp = await getDbImportJob({
+      path: { job_id: jobId },
+      client: vfkClient,
+    });
+    if (jobResp.error) {
+      return false;
+    }
+    assertIsDefined(jobResp.data);
+    if (jobResp.data.phase === 'done') {
+      return true;
+    }
+    if (jobResp.data.phase === 'failed') {
+      return false;
+    }
+    if (
+      jobResp.data.phase !== 'queued' &&
+      vfkImport.status !== DbImportStatus.RUNNING
+    ) {
+      vfkImport.status = DbImportStatus.RUNNING;
+      vfkFileImportStatusChange({ vfkImport });
+    }
+  }
+};
+
+const importVfkFile = async (vfkFile: VfkMetadata) => {
+  assertIsDefined(vfkFile.zoning_id);
+  const vfkImport: VfkFileImport = {
+    zoning_id: vfkFile.zoning_id,
+    status: DbImportStatus.WAITING,
+  };
+  const dbImportResp = await dbImport({
+    body: vfkFile.file,
+    client: vfkClient,
+  });
+  let success = false;
+  if (!dbImportResp.error) {
+    assertIsDefined(dbImportResp.data);
+    success = await waitForImportJob(dbImportResp.data.id, vfkImport);
+  }
+  vfkImport.status = success ? DbImportStatus.SUCCESS : DbImportStatus.FAILURE;
+  vfkFileImportStatusChange({ vfkImport });
+};
+
 const importVfkFiles = async (vfkFiles: VfkMetadata[]) => {
   for (const vfkFile of vfkFiles || []) {
     assertIsDefined(vfkFile.zoning_id);
@@ -64,22 +116,8 @@ const importVfkFiles = async (vfkFiles: VfkMetadata[]) => {
     };
     vfkFileImportStatusChange({ vfkImport });
   }
-  for (const vfkFile of vfkFiles || []) {
-    assertIsDefined(vfkFile.zoning_id);
-    const vfkImport: VfkFileImport = {
-      zoning_id: vfkFile.zoning_id,
-      status: DbImportStatus.RUNNING,
-    };
-    vfkFileImportStatusChange({ vfkImport });
-    const dbImportResp = await dbImport({
-      body: vfkFile.file,
-      client: vfkClient,
-    });
-    vfkImport.status = dbImportResp.error
-      ? DbImportStatus.FAILURE
-      : DbImportStatus.SUCCESS;
-    vfkFileImportStatusChange({ vfkImport });
-  }
+  // import jobs are queued and run by the server
+  await Promise.all((vfkFiles || []).map(importVfkFile));
 };
 
 const App = () => {